@@ -33,6 +33,7 @@ from genre.routers import genre
 from film_genre.routers import film_genre
 from showtime_seat.routers import showtime_seat
 from etl_metadata.routers import etl_metadata
+from etl_change_log.models import etl_change_log
 
 
 
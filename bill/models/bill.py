@@ -7,6 +7,12 @@ from configs.database import Base
 class Bill(Base):
     __tablename__ = "bills"
 
+    # PAID khi tạo; CANCELLED / REFUNDED qua /bill/cancel và /bill/refund (ETL gỡ fact của các bill này)
+    STATUS_PAID = "PAID"
+    STATUS_CANCELLED = "CANCELLED"
+    STATUS_REFUNDED = "REFUNDED"
+    CLOSED_STATUSES = (STATUS_CANCELLED, STATUS_REFUNDED)
+
     id = Column(Integer, primary_key=True, nullable=False, index=True)
     payment_method = Column(String, nullable=False)
     payment_time = Column(TIMESTAMP(timezone=True), nullable=False,server_default=text('now()'))
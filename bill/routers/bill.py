@@ -11,6 +11,7 @@ import math
 from food.models.food import Food
 from ticket.models.ticket import Ticket
 from user.models.user import User
+from etl_change_log.utils.etl_change_log import log_changes, OPERATION_DELETE, OPERATION_UPDATE
 
 
 router = APIRouter(
@@ -174,7 +175,7 @@ def search_bill(
 @router.put("/update/{bill_id}")
 def update_bill(
         bill_id: int,
-        bill: BillUpdate,
+        bill_update: BillUpdate,
         db: Session = Depends(get_db)
     ):
     try:
@@ -186,11 +187,13 @@ def update_bill(
                 detail="Bill not found"
             )
 
-        bill.payment_method = bill.payment_method
-        bill.payment_time = bill.payment_time
-        bill.status = bill.status
-        bill.value = bill.value
+        bill.payment_method = bill_update.payment_method or bill.payment_method
+        bill.payment_time = bill_update.payment_time or bill.payment_time
+        bill.status = bill_update.status or bill.status
+        bill.value = bill_update.value if bill_update.value is not None else bill.value
 
+        # Để ETL cập nhật (hoặc gỡ nếu bill bị hủy) các fact tương ứng
+        log_changes(db, "bills", [bill.id], OPERATION_UPDATE)
         db.commit()
 
         return JSONResponse(
@@ -206,6 +209,57 @@ def update_bill(
         )
     
 
+def _close_bill(bill_id: int, new_status: str, db: Session, require_paid=False):
+    try:
+        bill = db.query(Bill).filter(Bill.id == bill_id).first()
+
+        if bill is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Bill not found"
+            )
+        # Bill đã hủy / hoàn tiền không đổi trạng thái nữa; chỉ bill đã thanh toán mới hoàn tiền được
+        if bill.status in Bill.CLOSED_STATUSES or (require_paid and bill.status != Bill.STATUS_PAID):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Cannot change bill status from {bill.status} to {new_status}"
+            )
+
+        bill.status = new_status
+        # ETL gỡ các fact của bill đã hủy / hoàn tiền
+        log_changes(db, "bills", [bill.id], OPERATION_UPDATE)
+        db.commit()
+
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={"message": f"Bill {new_status.lower()} successfully"}
+        )
+
+    except SQLAlchemyError as e:
+        db.rollback()
+        return JSONResponse(
+            status_code=status.HTTP_409_CONFLICT,
+            content={"message": str(e)}
+        )
+
+
+@router.put("/cancel/{bill_id}")
+def cancel_bill(
+        bill_id: int,
+        db: Session = Depends(get_db)
+    ):
+    return _close_bill(bill_id, Bill.STATUS_CANCELLED, db)
+
+
+@router.put("/refund/{bill_id}")
+def refund_bill(
+        bill_id: int,
+        db: Session = Depends(get_db)
+    ):
+    return _close_bill(bill_id, Bill.STATUS_REFUNDED, db, require_paid=True)
+
+
+
 @router.put("/update-value/{bill_id}", response_model=BillResponse, status_code=status.HTTP_200_OK)
 def update_bill_value(
     bill_id: int,
@@ -233,6 +287,7 @@ def update_bill_value(
 
         # Update bill value
         bill.value = total_ticket_cost + food_cost
+        log_changes(db, "bills", [bill.id], OPERATION_UPDATE)
         db.commit()
 
         return BillResponse.from_orm(bill)
@@ -266,6 +321,8 @@ def update_all_bill_values(db: Session = Depends(get_db)):
             # Update bill value
             bill.value = total_ticket_cost + food_cost
 
+        log_changes(db, "bills", [bill.id for bill in bills], OPERATION_UPDATE)
+
         # Commit all changes
         db.commit()
 
@@ -296,6 +353,11 @@ def delete_bill(
                 detail="Bill not found"
             )
 
+        # Ticket bị xóa theo cascade ở DB nên phải ghi nhận trước khi xóa bill
+        ticket_ids = [ticket_id for (ticket_id,) in db.query(Ticket.id).filter(Ticket.bill_id == bill_id)]
+        log_changes(db, "bills", [bill_id], OPERATION_DELETE)
+        log_changes(db, "tickets", ticket_ids, OPERATION_DELETE)
+
         db.delete(bill)
         db.commit()
 
@@ -326,6 +388,11 @@ def delete_many_bills(
                 detail="Bills not found"
             )
 
+        deleted_ids = [bill.id for bill in bills]
+        ticket_ids = [ticket_id for (ticket_id,) in db.query(Ticket.id).filter(Ticket.bill_id.in_(deleted_ids))]
+        log_changes(db, "bills", deleted_ids, OPERATION_DELETE)
+        log_changes(db, "tickets", ticket_ids, OPERATION_DELETE)
+
         for bill in bills:
             db.delete(bill)
         
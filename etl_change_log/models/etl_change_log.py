@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, text
+from sqlalchemy.sql.sqltypes import TIMESTAMP
+from configs.database import Base
+
+
+class ETLChangeLog(Base):
+    __tablename__ = "etl_change_log"
+
+    id = Column(Integer, primary_key=True, nullable=False, index=True)
+    table_name = Column(String, nullable=False)
+    record_id = Column(Integer, nullable=False)
+    operation = Column(String, nullable=False)  # DELETE | UPDATE
+    changed_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'), index=True)
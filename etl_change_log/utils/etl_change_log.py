@@ -0,0 +1,15 @@
+from typing import Iterable
+from sqlalchemy.orm import Session
+from etl_change_log.models.etl_change_log import ETLChangeLog
+
+
+OPERATION_DELETE = "DELETE"
+OPERATION_UPDATE = "UPDATE"
+
+
+def log_changes(db: Session, table_name: str, record_ids: Iterable[int], operation: str):
+    # Ghi trong cùng transaction với thao tác xóa/sửa, commit do router đảm nhận
+    db.add_all([
+        ETLChangeLog(table_name=table_name, record_id=record_id, operation=operation)
+        for record_id in set(record_ids)
+    ])
@@ -22,6 +22,7 @@ from promotion.routers import promotion
 from bill_prom.routers import bill_prom
 from user_bill.routers import user_bill
 from mart.router import router as mart_router
+from mart.export import router as export_router
 from scheduler import start_scheduler
 import uvicorn
 
@@ -67,6 +68,7 @@ app.router.include_router(bill_prom.router)
 app.router.include_router(user_bill.router)
 
 app.router.include_router(mart_router)
+app.router.include_router(export_router)
 
 
 # if __name__ == "__main__":
@@ -0,0 +1,299 @@
+import argparse
+import json
+import logging
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from mart.mart_model import Base as MartBase
+from mart.runner import MART_JOBS
+from mart.refresh_state import clear_refresh_state
+from mart.forecast import run_forecast, query_forecast
+from mart.payloads import PAYLOADS, build_payload
+from mart.customers import query_unique_customers
+from mart.heatmap import query_fill_rate_heatmap
+from mart.cohorts import query_cohort_retention
+from mart.cube import normalize_query, run_cube_query
+from mart.response_cache import encode_json
+from warehouse.etl_metadata.utils.etl_metadata import mark_dirty_months
+from warehouse.partitions import PARTITIONED_FACT_TABLES, add_months
+from warehouse.synthetic import build_synthetic_warehouse, START_DATE, MONTHS
+
+try:
+    import resource
+except ImportError:  # resource chỉ có trên Unix; trên Windows bỏ qua max_rss_mb
+    resource = None
+
+
+SCALES = (1, 10, 100)
+JOB_REPEAT = 3
+ENDPOINT_REPEAT = 5
+PLANS_PER_JOB = 3               # số câu truy vấn chậm nhất của mỗi job được EXPLAIN
+TOLERANCE = 1.25                # chậm hơn baseline quá 25% là regression
+MIN_REGRESSION_SECONDS = 0.05   # bỏ qua chênh lệch tuyệt đối nhỏ (nhiễu đo)
+INCREMENTAL_MONTH = add_months(START_DATE, MONTHS - 1)  # tháng được đánh dấu bẩn khi đo refresh tăng dần
+
+
+# Endpoint -> phần việc của endpoint khi cache trống (không qua HTTP): truy vấn + serialize JSON
+ENDPOINTS = {
+    **{
+        f"/visualization/{endpoint}": (lambda endpoint: lambda mart_db, warehouse_db: build_payload(mart_db, endpoint))(endpoint)
+        for endpoint in PAYLOADS
+    },
+    "/visualization/fill_rate_heatmap": lambda mart_db, warehouse_db: query_fill_rate_heatmap(mart_db),
+    "/visualization/unique_customers": lambda mart_db, warehouse_db: query_unique_customers(
+        mart_db, START_DATE + timedelta(days=10), add_months(START_DATE, MONTHS) - timedelta(days=10)),
+    "/visualization/cohort_retention": lambda mart_db, warehouse_db: query_cohort_retention(mart_db),
+    "/visualization/forecast": lambda mart_db, warehouse_db: query_forecast(mart_db, "film"),
+    "/visualization/cube": lambda mart_db, warehouse_db: run_cube_query(
+        warehouse_db, normalize_query("month,cinema", "revenue,bill_count", {}, None, None, 1000)),
+}
+
+
+def _timed_runs(fn, repeat, prepare=None):
+    """Median wall time of `repeat` runs of fn, with prepare() (untimed) before each run and tracemalloc off."""
+    seconds = []
+    for _ in range(repeat):
+        if prepare:
+            prepare()
+        started = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            return {"status": "failed", "error": str(e), "seconds": round(time.perf_counter() - started, 4)}
+        seconds.append(time.perf_counter() - started)
+    return {"status": "ok", "seconds": round(statistics.median(seconds), 4), "runs": [round(v, 4) for v in seconds]}
+
+def _peak_memory(fn, result):
+    """
+    One extra run of fn under tracemalloc for the Python heap peak. Kept apart
+    from the timed runs: tracemalloc slows allocation-heavy code down a lot.
+    """
+    if result["status"] != "ok":
+        return result
+    tracemalloc.start()
+    try:
+        fn()
+        result["py_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+    except Exception as e:
+        result = {**result, "status": "failed", "error": str(e)}
+    finally:
+        tracemalloc.stop()
+    return result
+
+def _max_rss_mb():
+    """Peak RSS of the whole process in MB, or None where the resource module is unavailable."""
+    if resource is None:
+        return None
+    # ru_maxrss tính bằng KB trên Linux, bằng byte trên macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(max_rss / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+def _record_queries(engine):
+    """Collect (seconds, statement, parameters) of every SELECT run on `engine` until the returned stop() is called."""
+    queries = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["benchmark_started"] = time.perf_counter()
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            queries.append((time.perf_counter() - conn.info.pop("benchmark_started"), statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+
+    def stop():
+        event.remove(engine, "before_cursor_execute", before)
+        event.remove(engine, "after_cursor_execute", after)
+        return queries
+    return stop
+
+def _plan_summary(plan):
+    scans = []
+    def walk(node):
+        if "Relation Name" in node:
+            scans.append(f"{node['Node Type']} {node['Relation Name']}")
+        for child in node.get("Plans", []):
+            walk(child)
+    walk(plan["Plan"])
+    return {"total_cost": plan["Plan"]["Total Cost"], "plan_rows": plan["Plan"]["Plan Rows"], "scans": scans}
+
+def _explain(engine, queries):
+    plans = []
+    with engine.connect() as conn:
+        for seconds, statement, parameters in sorted(queries, key=lambda q: q[0], reverse=True)[:PLANS_PER_JOB]:
+            item = {"seconds": round(seconds, 4), "sql": " ".join(statement.split())[:200]}
+            try:
+                plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                item.update(_plan_summary(plan[0]))
+            except Exception as e:
+                # Bảng tạm của job đã bị xóa, ... : vẫn giữ thời gian, chỉ thiếu plan
+                conn.rollback()
+                item["error"] = str(e)
+            plans.append(item)
+    return plans
+
+
+def _run_job(load, engines):
+    warehouse_session = sessionmaker(bind=engines["warehouse"])()
+    mart_session = sessionmaker(bind=engines["mart"])()
+    try:
+        load(warehouse_session, mart_session)
+    finally:
+        warehouse_session.close()
+        mart_session.close()
+
+def _clear_job_state(engines, state_name):
+    mart_session = sessionmaker(bind=engines["mart"])()
+    try:
+        clear_refresh_state(mart_session, [state_name])
+    finally:
+        mart_session.close()
+
+def benchmark_jobs(engines, mode):
+    """
+    Median of JOB_REPEAT timed runs of every mart job (plus the forecast) in
+    `mode` (full/incremental), then one memory run that also records the
+    slowest query plans. Before each run the job's refresh state is cleared
+    (full) or the incremental month is marked dirty again (incremental).
+    """
+    jobs = dict(MART_JOBS)
+    jobs["forecast"] = (run_forecast, None)  # không có mốc refresh: luôn tính lại toàn bộ
+    results = {}
+    for name, (load, state_name) in jobs.items():
+        def prepare(state_name=state_name):
+            if mode == "incremental":
+                _mark_incremental_month(engines)
+            elif state_name:
+                _clear_job_state(engines, state_name)
+        run = (lambda load: lambda: _run_job(load, engines))(load)
+
+        result = _timed_runs(run, JOB_REPEAT, prepare)
+        prepare()
+        stop = _record_queries(engines["warehouse"])
+        result = _peak_memory(run, result)
+        queries = stop()
+        result["queries"] = len(queries)
+        result["plans"] = _explain(engines["warehouse"], queries) if queries else []
+        results[name] = result
+        logging.info(f"[benchmark] {mode} {name}: {result['status']} {result['seconds']}s, {result.get('py_peak_mb')} MB")
+    return results
+
+def benchmark_endpoints(engines):
+    """Median of ENDPOINT_REPEAT timed runs of each endpoint's query + JSON encoding, plus one memory run."""
+    mart_db = sessionmaker(bind=engines["mart"])()
+    warehouse_db = sessionmaker(bind=engines["warehouse"])()
+    results = {}
+    try:
+        for path, fn in ENDPOINTS.items():
+            run = (lambda fn: lambda: encode_json(fn(mart_db, warehouse_db)))(fn)
+            results[path] = _peak_memory(run, _timed_runs(run, ENDPOINT_REPEAT))
+            mart_db.rollback()
+            warehouse_db.rollback()
+            logging.info(f"[benchmark] endpoint {path}: {results[path]['status']} {results[path]['seconds']}s")
+    finally:
+        mart_db.close()
+        warehouse_db.close()
+    return results
+
+def _mark_incremental_month(engines):
+    session = sessionmaker(bind=engines["warehouse"])()
+    try:
+        for table_name in PARTITIONED_FACT_TABLES:
+            mark_dirty_months(session, table_name, [INCREMENTAL_MONTH])
+        session.commit()
+    finally:
+        session.close()
+
+def benchmark_scale(engines, scale, build=True):
+    """
+    Build the synthetic warehouse at `scale`, recreate the mart, then time
+    every job from scratch, every job with one month marked dirty, and every
+    endpoint.
+    """
+    result = {}
+    if build:
+        started = time.perf_counter()
+        result["warehouse"] = {k: str(v) for k, v in build_synthetic_warehouse(engines["warehouse"], scale=scale).items()}
+        result["build_seconds"] = round(time.perf_counter() - started, 2)
+    MartBase.metadata.drop_all(engines["mart"])
+    MartBase.metadata.create_all(engines["mart"])
+
+    result["full"] = benchmark_jobs(engines, "full")
+    result["incremental"] = benchmark_jobs(engines, "incremental")
+    result["endpoints"] = benchmark_endpoints(engines)
+    return result
+
+
+def _timings(results):
+    # {(scale, nhóm, tên): seconds} cho mọi phép đo thành công
+    return {
+        (scale, group, name): measurement["seconds"]
+        for scale, by_group in results["scales"].items()
+        for group in ("full", "incremental", "endpoints")
+        for name, measurement in by_group.get(group, {}).items()
+        if measurement["status"] == "ok"
+    }
+
+def find_regressions(results, baseline, tolerance=TOLERANCE):
+    """Measurements slower than baseline * tolerance (and by more than MIN_REGRESSION_SECONDS)."""
+    current, previous = _timings(results), _timings(baseline)
+    return [
+        f"{scale}x {group} {name}: {current[key]}s so với baseline {previous[key]}s"
+        for key in sorted(set(current) & set(previous))
+        for scale, group, name in [key]
+        if current[key] > previous[key] * tolerance and current[key] - previous[key] > MIN_REGRESSION_SECONDS
+    ]
+
+def _failures(results):
+    return [
+        f"{scale}x {group} {name}: {measurement.get('error')}"
+        for scale, by_group in results["scales"].items()
+        for group in ("full", "incremental", "endpoints")
+        for name, measurement in by_group.get(group, {}).items()
+        if measurement["status"] != "ok"
+    ]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Đo thời gian refresh mart và endpoint trên warehouse giả lập ở nhiều scale")
+    parser.add_argument("--warehouse-url", required=True, help="Database scratch; sẽ bị xóa và tạo lại")
+    parser.add_argument("--mart-url", required=True, help="Database mart scratch; các bảng mart bị xóa và tạo lại")
+    parser.add_argument("--scales", nargs="+", type=float, default=list(SCALES))
+    parser.add_argument("--skip-build", action="store_true", help="Dùng lại warehouse đã sinh (chỉ đo một scale)")
+    parser.add_argument("--output", default="benchmark.json", help="Ghi kết quả JSON ra file")
+    parser.add_argument("--baseline", help="File kết quả của lần chạy trước để so sánh")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+    if args.skip_build and len(args.scales) != 1:
+        parser.error("--skip-build chỉ dùng với một scale")
+
+    engines = {"warehouse": create_engine(args.warehouse_url), "mart": create_engine(args.mart_url)}
+    results = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "scales": {},
+    }
+    for scale in args.scales:
+        results["scales"][f"{scale:g}"] = benchmark_scale(engines, scale, build=not args.skip_build)
+    max_rss_mb = _max_rss_mb()
+    if max_rss_mb is not None:
+        results["max_rss_mb"] = max_rss_mb
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False, default=str)
+
+    problems = _failures(results)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems += find_regressions(results, json.load(f), args.tolerance)
+    for problem in problems:
+        logging.error(f"[benchmark] {problem}")
+    raise SystemExit(1 if problems else 0)
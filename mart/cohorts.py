@@ -0,0 +1,52 @@
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+from mart.mart_model import MartCohortRetention
+
+
+def query_cohort_retention(db: Session, cohort_from=None, cohort_to=None, max_months=None):
+    """
+    Cohort matrix for first-purchase months in [cohort_from, cohort_to]:
+    row i is a cohort, column j its active customers j months later (the
+    cohort size at j = 0), plus the same matrix as a share of the cohort size.
+    """
+    if cohort_from and cohort_to and cohort_from > cohort_to:
+        raise ValueError("from phải nhỏ hơn hoặc bằng to")
+
+    cohort = tuple_(MartCohortRetention.cohort_year, MartCohortRetention.cohort_month)
+    query = db.query(
+        MartCohortRetention.cohort_year, MartCohortRetention.cohort_month,
+        MartCohortRetention.months_since, MartCohortRetention.active_customers,
+    )
+    if cohort_from:
+        query = query.filter(cohort >= cohort_from)
+    if cohort_to:
+        query = query.filter(cohort <= cohort_to)
+    if max_months is not None:
+        query = query.filter(MartCohortRetention.months_since <= max_months)
+    rows = query.order_by(MartCohortRetention.cohort_year, MartCohortRetention.cohort_month).all()
+
+    # Tháng hoạt động mới nhất đã tính: mỗi cohort có số cột tới tháng đó (hàng tam giác)
+    latest = db.query(func.max(MartCohortRetention.year * 12 + MartCohortRetention.month - 1)).scalar()
+    cohorts = {}
+    for cohort_year, cohort_month, months_since, active in rows:
+        cohorts.setdefault((cohort_year, cohort_month), {})[months_since] = active
+
+    active, retention = [], []
+    for (cohort_year, cohort_month), offsets in cohorts.items():
+        length = latest - (cohort_year * 12 + cohort_month - 1) + 1
+        if max_months is not None:
+            length = min(length, max_months + 1)
+        # Tháng không có khách nào quay lại không có dòng trong mart -> 0
+        counts = [offsets.get(j, 0) for j in range(length)]
+        size = offsets.get(0, 0)
+        active.append(counts)
+        retention.append([round(count / size, 4) if size else None for count in counts])
+
+    width = max((len(counts) for counts in active), default=0)
+    return {
+        "cohorts": ["%04d-%02d" % key for key in cohorts],
+        "sizes": [offsets.get(0, 0) for offsets in cohorts.values()],
+        "months_since": list(range(width)),
+        "active_customers": active,
+        "retention": retention,
+    }
@@ -0,0 +1,270 @@
+from datetime import date, timedelta
+from sqlalchemy import BigInteger, Column, Float, Integer, MetaData, Table, cast, func, select, tuple_
+from warehouse.warehouse_models import (
+    AggDailyRevenue, AggDailyTicket, AggDailyPromotion, AggDailyRating,
+    DimCinema, DimFilm, DimGenre, DimPaymentMethod, DimPurchaseType, FactFilmGenre,
+)
+
+
+DATE_GRAINS = ("day", "week", "month", "quarter", "year")
+MAX_LIMIT = 10000
+
+# Chiều -> (cột khóa trong rollup, bảng dim, cột khóa dim, cột tên hiển thị).
+# genre không nằm trong rollup: đi qua bảng cầu fact_film_genre từ film_id.
+DIMENSIONS = {
+    "cinema": ("cinema_id", DimCinema, DimCinema.cinema_id, DimCinema.name),
+    "film": ("film_id", DimFilm, DimFilm.film_id, DimFilm.title),
+    "genre": ("film_id", DimGenre, DimGenre.genre_id, DimGenre.name),
+    "payment_method": ("payment_method_id", DimPaymentMethod, DimPaymentMethod.payment_method_id, DimPaymentMethod.method_name),
+    "purchase_type": ("purchase_type_id", DimPurchaseType, DimPurchaseType.purchase_type_id, DimPurchaseType.type_name),
+}
+
+
+def _daily_grains(c):
+    date_col = c.date_id
+    year = cast(func.extract("year", date_col), Integer)
+    return {
+        "day": [("date", date_col)],
+        "week": [("week_start", cast(func.date_trunc("week", date_col), date_col.type))],
+        "month": [("year", year), ("month", cast(func.extract("month", date_col), Integer))],
+        "quarter": [("year", year), ("quarter", cast(func.extract("quarter", date_col), Integer))],
+        "year": [("year", year)],
+    }
+
+def _daily_date_filter(c, date_from, date_to):
+    conditions = []
+    if date_from:
+        conditions.append(c.date_id >= date_from)
+    if date_to:
+        conditions.append(c.date_id <= date_to)
+    return conditions
+
+
+def _monthly_grains(c):
+    return {
+        "month": [("year", c.year), ("month", c.month)],
+        "quarter": [("year", c.year), ("quarter", (c.month - 1) // 3 + 1)],
+        "year": [("year", c.year)],
+    }
+
+def _monthly_date_filter(c, date_from, date_to):
+    conditions = []
+    if date_from:
+        conditions.append(tuple_(c.year, c.month) >= (date_from.year, date_from.month))
+    if date_to:
+        conditions.append(tuple_(c.year, c.month) <= (date_to.year, date_to.month))
+    return conditions
+
+def _month_aligned(date_from, date_to):
+    # Rollup theo tháng chỉ trả lời được khoảng ngày trọn tháng
+    return (date_from is None or date_from.day == 1) and (date_to is None or (date_to + timedelta(days=1)).day == 1)
+
+# Materialized view trong warehouse (warehouse/matviews.py), refresh sau mỗi lần ETL
+MV_MONTHLY_REVENUE = Table(
+    "mv_monthly_revenue", MetaData(),
+    Column("year", Integer), Column("month", Integer),
+    Column("cinema_id", Integer), Column("film_id", Integer),
+    Column("payment_method_id", Integer), Column("purchase_type_id", Integer),
+    Column("bill_count", Integer), Column("revenue", BigInteger),
+)
+
+
+# Các rollup có thể trả lời truy vấn cube, xếp từ nhỏ đến lớn: rollup đầu tiên đủ chiều,
+# đủ measure và đủ độ mịn thời gian sẽ được dùng.
+ROLLUPS = [
+    {
+        "name": "agg_daily_promotion",
+        "table": AggDailyPromotion.__table__,
+        "dimensions": set(),
+        "grains": set(DATE_GRAINS),
+        "grain_columns": _daily_grains,
+        "date_filter": _daily_date_filter,
+        "date_range_ok": lambda date_from, date_to: True,
+        "measures": {
+            "used_count": lambda m: func.sum(m.used_count),
+            "not_used_count": lambda m: func.sum(m.not_used_count),
+            "used_ratio": lambda m: func.sum(m.used_count) / func.nullif(func.sum(m.used_count + m.not_used_count), 0).cast(Float),
+        },
+    },
+    {
+        "name": "agg_daily_ticket",
+        "table": AggDailyTicket.__table__,
+        "dimensions": {"payment_method", "purchase_type"},
+        "grains": set(DATE_GRAINS),
+        "grain_columns": _daily_grains,
+        "date_filter": _daily_date_filter,
+        "date_range_ok": lambda date_from, date_to: True,
+        "measures": {
+            "ticket_count": lambda m: func.sum(m.ticket_count),
+            "ticket_revenue": lambda m: func.sum(m.ticket_revenue),
+        },
+    },
+    {
+        "name": "agg_daily_rating",
+        "table": AggDailyRating.__table__,
+        "dimensions": {"film", "genre"},
+        "grains": set(DATE_GRAINS),
+        "grain_columns": _daily_grains,
+        "date_filter": _daily_date_filter,
+        "date_range_ok": lambda date_from, date_to: True,
+        "measures": {
+            "rating_count": lambda m: func.sum(m.rating_count),
+            "avg_rating": lambda m: func.sum(m.rating_sum) / func.nullif(func.sum(m.rating_count), 0).cast(Float),
+        },
+    },
+    {
+        "name": "mv_monthly_revenue",
+        "table": MV_MONTHLY_REVENUE,
+        "dimensions": {"cinema", "film", "genre", "payment_method", "purchase_type"},
+        "grains": {"month", "quarter", "year"},
+        "grain_columns": _monthly_grains,
+        "date_filter": _monthly_date_filter,
+        "date_range_ok": _month_aligned,
+        "measures": {
+            "revenue": lambda m: func.sum(m.revenue),
+            "bill_count": lambda m: func.sum(m.bill_count),
+            "avg_bill_value": lambda m: func.sum(m.revenue) / func.nullif(func.sum(m.bill_count), 0).cast(Float),
+        },
+    },
+    {
+        "name": "agg_daily_revenue",
+        "table": AggDailyRevenue.__table__,
+        "dimensions": {"cinema", "film", "genre", "payment_method", "purchase_type"},
+        "grains": set(DATE_GRAINS),
+        "grain_columns": _daily_grains,
+        "date_filter": _daily_date_filter,
+        "date_range_ok": lambda date_from, date_to: True,
+        "measures": {
+            "revenue": lambda m: func.sum(m.revenue),
+            "bill_count": lambda m: func.sum(m.bill_count),
+            "avg_bill_value": lambda m: func.sum(m.revenue) / func.nullif(func.sum(m.bill_count), 0).cast(Float),
+        },
+    },
+]
+
+
+def _parse_list(value):
+    if not value:
+        return []
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+def normalize_query(dimensions, measures, filters, date_from=None, date_to=None, limit=1000):
+    """
+    Validate a cube request and return it in canonical form (sorted, de-duplicated),
+    which is also the response-cache key. Raises ValueError on unknown names.
+    """
+    dims = sorted(set(_parse_list(dimensions)))
+    grains = [d for d in dims if d in DATE_GRAINS]
+    if len(grains) > 1:
+        raise ValueError(f"Chỉ được chọn một độ mịn thời gian, nhận: {', '.join(grains)}")
+    unknown = [d for d in dims if d not in DATE_GRAINS and d not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Chiều không hợp lệ: {', '.join(unknown)}")
+
+    known_measures = {name for rollup in ROLLUPS for name in rollup["measures"]}
+    meas = sorted(set(_parse_list(measures)))
+    if not meas:
+        raise ValueError("Cần ít nhất một measure")
+    unknown = [m for m in meas if m not in known_measures]
+    if unknown:
+        raise ValueError(f"Measure không hợp lệ: {', '.join(unknown)}")
+
+    norm_filters = tuple(sorted(
+        (name, tuple(sorted(set(values)))) for name, values in filters.items() if values
+    ))
+    for name, _ in norm_filters:
+        if name not in DIMENSIONS:
+            raise ValueError(f"Bộ lọc không hợp lệ: {name}")
+    if date_from and date_to and date_from > date_to:
+        raise ValueError("date_from phải nhỏ hơn hoặc bằng date_to")
+
+    return (
+        grains[0] if grains else None,
+        tuple(d for d in dims if d in DIMENSIONS),
+        tuple(meas),
+        norm_filters,
+        date_from,
+        date_to,
+        max(1, min(limit, MAX_LIMIT)),
+    )
+
+def choose_rollup(grain, dims, measures, filters, date_from=None, date_to=None):
+    """First (smallest) rollup that has every requested dimension, filter and measure at the requested date grain."""
+    needed = set(dims) | {name for name, _ in filters}
+    for rollup in ROLLUPS:
+        if (needed <= rollup["dimensions"] and set(measures) <= set(rollup["measures"])
+                and (grain is None or grain in rollup["grains"])
+                and rollup["date_range_ok"](date_from, date_to)):
+            return rollup
+    raise ValueError("Không có rollup nào trả lời được tổ hợp chiều/measure này")
+
+
+def build_cube_query(rollup, grain, dims, measures, filters, date_from, date_to, limit):
+    table = rollup["table"]
+    c = table.c
+    columns, group_by, labels = [], [], []
+
+    if grain:
+        for label, expr in rollup["grain_columns"](c)[grain]:
+            columns.append(expr.label(label))
+            group_by.append(expr)
+            labels.append(label)
+
+    joins = []
+    for name in dims:
+        key, dim_model, dim_key, dim_name = DIMENSIONS[name]
+        if name == "genre":
+            # Phim nhiều thể loại được tính cho từng thể loại (tổng theo genre có thể lớn hơn tổng chung)
+            joins.append((FactFilmGenre, FactFilmGenre.film_id == getattr(c, key)))
+            joins.append((dim_model, dim_key == FactFilmGenre.genre_id))
+            key_expr = FactFilmGenre.genre_id
+        else:
+            joins.append((dim_model, dim_key == getattr(c, key)))
+            key_expr = getattr(c, key)
+        columns += [key_expr.label(f"{name}_id"), dim_name.label(f"{name}_name")]
+        group_by += [key_expr, dim_name]
+        labels += [f"{name}_id", f"{name}_name"]
+
+    for name in measures:
+        columns.append(rollup["measures"][name](c).label(name))
+        labels.append(name)
+
+    query = select(*columns).select_from(table)
+    for target, onclause in joins:
+        # outer join: khóa 0 (không xác định) vẫn được giữ, tên là null
+        query = query.outerjoin(target, onclause)
+
+    conditions = rollup["date_filter"](c, date_from, date_to)
+    for name, values in filters:
+        key = DIMENSIONS[name][0]
+        if name == "genre" and name in dims:
+            # Đã join fact_film_genre để nhóm theo genre: lọc trên chính dòng join,
+            # nếu không các thể loại khác của cùng phim cũng lọt vào kết quả
+            conditions.append(FactFilmGenre.genre_id.in_(values))
+        elif name == "genre":
+            # Lọc theo genre bằng semi-join để không nhân bản dòng khi không nhóm theo genre
+            conditions.append(getattr(c, key).in_(
+                select(FactFilmGenre.film_id).where(FactFilmGenre.genre_id.in_(values))
+            ))
+        else:
+            conditions.append(getattr(c, key).in_(values))
+    if conditions:
+        query = query.where(*conditions)
+    if group_by:
+        query = query.group_by(*group_by).order_by(*group_by)
+    return query.limit(limit), labels
+
+
+def run_cube_query(db, normalized):
+    grain, dims, measures, filters, date_from, date_to, limit = normalized
+    rollup = choose_rollup(grain, dims, measures, filters, date_from, date_to)
+    query, labels = build_cube_query(rollup, grain, dims, measures, filters, date_from, date_to, limit)
+    rows = db.execute(query).all()
+    return {
+        "rollup": rollup["name"],
+        "columns": labels,
+        "results": [
+            {label: (value.isoformat() if isinstance(value, date) else value) for label, value in zip(labels, row)}
+            for row in rows
+        ],
+    }
@@ -0,0 +1,71 @@
+from datetime import date, timedelta
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from mart.mart_model import MartCustomerSketch
+from mart import hll
+from warehouse.partitions import add_months
+
+
+GRAINS = ("month", "total")
+
+
+def _sketch_conditions(date_from, date_to):
+    # Tháng nằm trọn trong khoảng: đọc sketch cả tháng (day = 0); tháng đầu/cuối lẻ: đọc sketch từng ngày
+    conditions = []
+    first = date(date_from.year, date_from.month, 1)
+    while first <= date_to:
+        last = add_months(first, 1) - timedelta(days=1)
+        low, high = max(first, date_from), min(last, date_to)
+        same_month = and_(MartCustomerSketch.year == first.year, MartCustomerSketch.month == first.month)
+        if low == first and high == last:
+            conditions.append(and_(same_month, MartCustomerSketch.day == 0))
+        else:
+            conditions.append(and_(same_month, MartCustomerSketch.day.between(low.day, high.day)))
+        first = add_months(first, 1)
+    return conditions
+
+def query_unique_customers(db: Session, date_from, date_to, cinema_ids=(), grain="month"):
+    """
+    Approximate distinct customers between two dates (inclusive), per month or
+    for the whole range, merged from the stored daily/monthly sketches.
+    repeat_customers is exact when a single stored sketch answers the bucket,
+    otherwise None (repeat counts do not merge).
+    """
+    if grain not in GRAINS:
+        raise ValueError(f"grain phải là một trong: {', '.join(GRAINS)}")
+    if date_from > date_to:
+        raise ValueError("date_from phải nhỏ hơn hoặc bằng date_to")
+
+    rows = (
+        db.query(
+            MartCustomerSketch.year, MartCustomerSketch.month, MartCustomerSketch.bill_count,
+            MartCustomerSketch.unique_customers, MartCustomerSketch.repeat_customers, MartCustomerSketch.registers,
+        )
+        .filter(MartCustomerSketch.cinema_id.in_(list(cinema_ids) or [0]))
+        .filter(or_(*_sketch_conditions(date_from, date_to)))
+        .all()
+    )
+
+    buckets = {}
+    for row in rows:
+        buckets.setdefault((row.year, row.month) if grain == "month" else None, []).append(row)
+
+    results = []
+    for key, bucket in sorted(buckets.items(), key=lambda item: item[0] or (0, 0)):
+        if len(bucket) == 1:
+            unique, repeat = bucket[0].unique_customers, bucket[0].repeat_customers
+        else:
+            unique = round(hll.estimate(hll.merge([hll.from_bytes(row.registers) for row in bucket])))
+            repeat = None
+        result = {"unique_customers": unique, "repeat_customers": repeat,
+                  "bill_count": sum(row.bill_count for row in bucket)}
+        if key:
+            result = {"year": key[0], "month": key[1], **result}
+        results.append(result)
+
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "standard_error": round(hll.STANDARD_ERROR, 4),  # sai số tương đối của unique_customers
+        "results": results,
+    }
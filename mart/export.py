@@ -0,0 +1,157 @@
+import csv
+import io
+import os
+import tempfile
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+import xlsxwriter
+from configs.authentication import get_current_user
+from mart.database import engine as mart_engine
+from mart.mart_model import Base as MartBase
+from warehouse.database import engine as warehouse_engine
+from warehouse.warehouse_models import (
+    FactRevenue, FactTicketAnalysis, FactShowtimeFillRate, FactFilmRating, FactPromotionAnalysis,
+)
+
+
+CHUNK_ROWS = 5000          # số dòng mỗi lần fetch từ server-side cursor
+FILE_CHUNK_BYTES = 1 << 16
+XLSX_MAX_ROWS = 1048576    # giới hạn dòng của một sheet Excel (kể cả dòng tiêu đề)
+FORMATS = ("csv", "xlsx")
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Bảng nội bộ của mart không xuất: trạng thái refresh, cache payload, sketch nhị phân, khóa khách hàng
+INTERNAL_MART_TABLES = {
+    "mart_refresh_state", "mart_generation", "mart_payload", "mart_customer_sketch", "mart_customer_first_purchase",
+}
+MART_TABLES = {name: table for name, table in MartBase.metadata.tables.items() if name not in INTERNAL_MART_TABLES}
+FACT_TABLES = {
+    model.__tablename__: model.__table__
+    for model in (FactRevenue, FactTicketAnalysis, FactShowtimeFillRate, FactFilmRating, FactPromotionAnalysis)
+}
+SKIPPED_COLUMNS = {"id", "updated_at", "etl_loaded_at"}
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+
+def _export_columns(table):
+    return [column for column in table.columns if column.name not in SKIPPED_COLUMNS]
+
+def _stream_rows(engine, query):
+    # Server-side cursor: mỗi lần chỉ giữ CHUNK_ROWS dòng trong bộ nhớ.
+    # Kết nối mở trong generator vì session của dependency đã đóng trước khi response được gửi.
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=CHUNK_ROWS).execute(query)
+        for partition in result.partitions():
+            yield partition
+
+def iter_csv(header, chunks):
+    """CSV bytes, one yield per fetched chunk. UTF-8 with BOM so Excel shows Vietnamese correctly."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+
+def iter_xlsx(header, chunks, sheet_name="data"):
+    """
+    XLSX bytes. XlsxWriter in constant_memory mode flushes each row to a temp
+    file as it is written; the workbook is a zip finished only on close(), so
+    it is built on disk first and then streamed in fixed-size chunks.
+    """
+    handle, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(handle)
+    try:
+        workbook = xlsxwriter.Workbook(path, {
+            "constant_memory": True,
+            "default_date_format": "yyyy-mm-dd",
+            "remove_timezone": True,
+        })
+        bold = workbook.add_format({"bold": True})
+        sheet, row_index, sheet_count = None, XLSX_MAX_ROWS, 0
+        for rows in chunks:
+            for row in rows:
+                # Hết chỗ trong sheet hiện tại: sang sheet mới (constant_memory chỉ ghi tuần tự)
+                if row_index >= XLSX_MAX_ROWS:
+                    sheet_count += 1
+                    sheet = workbook.add_worksheet(sheet_name if sheet_count == 1 else f"{sheet_name}_{sheet_count}")
+                    sheet.write_row(0, 0, header, bold)
+                    row_index = 1
+                sheet.write_row(row_index, 0, row)
+                row_index += 1
+        if sheet is None:
+            workbook.add_worksheet(sheet_name).write_row(0, 0, header, bold)
+        workbook.close()
+
+        with open(path, "rb") as f:
+            while chunk := f.read(FILE_CHUNK_BYTES):
+                yield chunk
+    finally:
+        os.remove(path)
+
+def export_response(name, fmt, header, chunks):
+    body = iter_csv(header, chunks) if fmt == "csv" else iter_xlsx(header, chunks, name[:31])
+    return StreamingResponse(body, media_type=MEDIA_TYPES[fmt],
+                             headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'})
+
+
+def _check_format(fmt):
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"format phải là một trong: {', '.join(FORMATS)}")
+
+@router.get("/mart/{table_name}", status_code=status.HTTP_200_OK)
+def export_mart_table(table_name: str, format: str = Query("csv", description="csv | xlsx")):
+    _check_format(format)
+    table = MART_TABLES.get(table_name)
+    if table is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Không có bảng mart {table_name}. Có thể xuất: {', '.join(sorted(MART_TABLES))}")
+    columns = _export_columns(table)
+    query = select(*columns).order_by(*[column for column in table.primary_key.columns])
+    return export_response(table_name, format, [column.name for column in columns], _stream_rows(mart_engine, query))
+
+@router.get("/fact/{table_name}", status_code=status.HTTP_200_OK)
+def export_fact_table(
+    table_name: str,
+    date_from: date,
+    date_to: date,
+    format: str = Query("csv", description="csv | xlsx"),
+    cinema_id: Optional[List[int]] = Query(None),
+    film_id: Optional[List[int]] = Query(None),
+    current_user=Depends(get_current_user),
+):
+    # Fact ở mức từng bill/vé (có user_id, thông tin chi tiết): chỉ người dùng đã đăng nhập được xuất
+    if current_user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Cần đăng nhập để xuất dữ liệu fact",
+                            headers={"WWW-Authenticate": "Bearer"})
+    # Bắt buộc khoảng ngày: bảng fact partition theo tháng, chỉ quét các partition cần thiết
+    _check_format(format)
+    table = FACT_TABLES.get(table_name)
+    if table is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Không có bảng fact {table_name}. Có thể xuất: {', '.join(sorted(FACT_TABLES))}")
+    if date_from > date_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_from phải nhỏ hơn hoặc bằng date_to")
+
+    columns = _export_columns(table)
+    query = select(*columns).where(table.c.date_id.between(date_from, date_to))
+    for name, values in (("cinema_id", cinema_id), ("film_id", film_id)):
+        if not values:
+            continue
+        if name not in table.c:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Bảng {table_name} không có cột {name}")
+        query = query.where(table.c[name].in_(values))
+    query = query.order_by(table.c.date_id)
+
+    filename = f"{table_name}_{date_from:%Y%m%d}_{date_to:%Y%m%d}"
+    return export_response(filename, format, [column.name for column in columns], _stream_rows(warehouse_engine, query))
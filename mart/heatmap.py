@@ -0,0 +1,68 @@
+import numpy as np
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+from mart.mart_model import MartFillRateHeatmap
+
+
+WEEKDAYS = list(range(1, 8))  # 1: thứ Hai ... 7: Chủ nhật
+HOURS = list(range(24))
+
+
+def query_fill_rate_heatmap(db: Session, month_from=None, month_to=None, cinema_ids=()):
+    """
+    Mean fill rate and showtime count per cinema x weekday x hour over the
+    (year, month) range, as dense 7x24 grids per cinema (null where no
+    showtime ran) instead of one row per cell.
+    """
+    if month_from and month_to and month_from > month_to:
+        raise ValueError("from phải nhỏ hơn hoặc bằng to")
+
+    period = tuple_(MartFillRateHeatmap.year, MartFillRateHeatmap.month)
+    query = db.query(
+        MartFillRateHeatmap.cinema_id,
+        MartFillRateHeatmap.cinema_name,
+        MartFillRateHeatmap.weekday,
+        MartFillRateHeatmap.hour,
+        func.sum(MartFillRateHeatmap.showtime_count),
+        func.sum(MartFillRateHeatmap.fill_rate_sum),
+    )
+    if month_from:
+        query = query.filter(period >= month_from)
+    if month_to:
+        query = query.filter(period <= month_to)
+    if cinema_ids:
+        query = query.filter(MartFillRateHeatmap.cinema_id.in_(cinema_ids))
+    rows = query.group_by(
+        MartFillRateHeatmap.cinema_id, MartFillRateHeatmap.cinema_name, MartFillRateHeatmap.weekday, MartFillRateHeatmap.hour
+    ).all()
+
+    # Các tháng có thể lưu tên rạp khác nhau: lấy một tên cho mỗi rạp
+    names = {row[0]: row[1] for row in rows}
+    cinema_list = sorted(names)
+    counts = np.zeros((len(cinema_list), len(WEEKDAYS), len(HOURS)), dtype=np.int64)
+    sums = np.zeros(counts.shape)
+    if rows:
+        index = (
+            np.searchsorted(cinema_list, [row[0] for row in rows]),
+            np.array([row[2] for row in rows]) - 1,
+            np.array([row[3] for row in rows]),
+        )
+        np.add.at(counts, index, [int(row[4]) for row in rows])
+        np.add.at(sums, index, [float(row[5]) for row in rows])
+    mean = np.round(np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0), 4)
+
+    return {
+        "from": "%04d-%02d" % month_from if month_from else None,
+        "to": "%04d-%02d" % month_to if month_to else None,
+        "weekdays": WEEKDAYS,
+        "hours": HOURS,
+        "cinemas": [
+            {
+                "cinema_id": cinema_id,
+                "cinema_name": names[cinema_id],
+                "fill_rate": np.where(counts[i] > 0, mean[i], None).tolist(),
+                "showtime_count": counts[i].tolist(),
+            }
+            for i, cinema_id in enumerate(cinema_list)
+        ],
+    }
@@ -1,11 +1,13 @@
-from sqlalchemy import Column, Integer, String, Boolean, Date, ForeignKey, Float, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, Date, ForeignKey, Float, DateTime, LargeBinary
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
-from sqlalchemy import BigInteger
+from sqlalchemy import BigInteger, Index
 Base = declarative_base()
 
 class MartRevenueByMonth(Base):
     __tablename__ = "mart_revenue_by_month"
+    # Khóa keyset/lọc khoảng tháng của endpoint (mart/payloads.py)
+    __table_args__ = (Index("ix_mart_revenue_by_month_year_month", "year", "month"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     year = Column(Integer, nullable=False)
@@ -15,6 +17,7 @@ class MartRevenueByMonth(Base):
 
 class MartTopFilmRevenue(Base):
     __tablename__ = "mart_top_film_revenue"
+    __table_args__ = (Index("ix_mart_top_film_revenue_year_month_rank", "year", "month", "rank"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     film_id = Column(Integer, nullable=False)
@@ -22,29 +25,76 @@ class MartTopFilmRevenue(Base):
     total_revenue = Column(BigInteger, nullable=False)
     year = Column(Integer, nullable=False)
     month = Column(Integer, nullable=False)
+    rank = Column(Integer, nullable=False)  # 1 = doanh thu cao nhất tháng
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class MartTopFilmRevenueByCinema(Base):
+    __tablename__ = "mart_top_film_revenue_by_cinema"
+    __table_args__ = (Index("ix_mart_top_film_revenue_by_cinema_year_month_cinema_rank", "year", "month", "cinema_id", "rank"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    cinema_id = Column(Integer, nullable=False)
+    cinema_name = Column(String, nullable=False)
+    film_id = Column(Integer, nullable=False)
+    film_title = Column(String, nullable=False)
+    total_revenue = Column(BigInteger, nullable=False)
+    rank = Column(Integer, nullable=False)  # xếp hạng trong (tháng, rạp)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 class MartFilmRatingSummary(Base):
     __tablename__ = "mart_film_rating_summary"
+    __table_args__ = (Index("ix_mart_film_rating_summary_weighted_film", "weighted_rating", "film_id"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     film_id = Column(Integer, nullable=False)
     film_title = Column(String, nullable=False)
     avg_rating = Column(Float, nullable=False)
     total_reviews = Column(Integer, nullable=False)
+    rating_sum = Column(BigInteger, nullable=False)
+    rating_1 = Column(Integer, nullable=False)  # histogram số đánh giá theo điểm 1-5
+    rating_2 = Column(Integer, nullable=False)
+    rating_3 = Column(Integer, nullable=False)
+    rating_4 = Column(Integer, nullable=False)
+    rating_5 = Column(Integer, nullable=False)
+    median_rating = Column(Float, nullable=False)
+    weighted_rating = Column(Float, nullable=False)  # điểm Bayes: kéo phim ít đánh giá về điểm trung bình chung
 
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 class MartShowtimeFillRate(Base):
-    __tablename__ = "mart_showtime_fill_rate"
+    __tablename__ = "mart_showtime_fill_rate_monthly"
+    __table_args__ = (Index("ix_mart_showtime_fill_rate_monthly_year_month_cinema_film", "year", "month", "cinema_id", "film_id"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     year = Column(Integer, nullable=False)
     month = Column(Integer, nullable=False)
-    showtime_id = Column(Integer, nullable=False)
-    showtime_name = Column(String, nullable=False)
+    cinema_id = Column(Integer, nullable=False)  # 0: suất chiếu chưa xác định được rạp
+    cinema_name = Column(String, nullable=False)
+    film_id = Column(Integer, nullable=False)
+    film_title = Column(String, nullable=False)
+    showtime_count = Column(Integer, nullable=False)
     avg_fill_rate = Column(Float, nullable=False)
+    p50_fill_rate = Column(Float, nullable=False)
+    p90_fill_rate = Column(Float, nullable=False)
+    sold_out_count = Column(Integer, nullable=False)  # booked_seats >= total_seats
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+class MartFillRateHeatmap(Base):
+    __tablename__ = "mart_fill_rate_heatmap"
+    __table_args__ = (Index("ix_mart_fill_rate_heatmap_year_month_cinema", "year", "month", "cinema_id"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    cinema_id = Column(Integer, nullable=False)  # 0: suất chiếu chưa xác định được rạp
+    cinema_name = Column(String, nullable=False)
+    weekday = Column(Integer, nullable=False)  # 1: thứ Hai ... 7: Chủ nhật
+    hour = Column(Integer, nullable=False)  # giờ bắt đầu suất chiếu
+    showtime_count = Column(Integer, nullable=False)
+    fill_rate_sum = Column(Float, nullable=False)  # lưu tổng để cộng dồn nhiều tháng, trung bình = sum / count
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 class MartRevenueByCinema(Base):
     __tablename__ = "mart_revenue_by_cinema"
+    __table_args__ = (Index("ix_mart_revenue_by_cinema_year_month_cinema", "year", "month", "cinema_id"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     cinema_id = Column(Integer, nullable=False)
@@ -55,6 +105,7 @@ class MartRevenueByCinema(Base):
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 class MartPaymentMethodMonthly(Base):
     __tablename__ = "mart_payment_method_monthly"
+    __table_args__ = (Index("ix_mart_payment_method_monthly_year_month_method", "year", "month", "payment_method_id"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     payment_method_id = Column(Integer, nullable=False)
@@ -66,6 +117,7 @@ class MartPaymentMethodMonthly(Base):
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 class MartPromotionRatioMonthly(Base):
     __tablename__ = "mart_promotion_ratio_monthly"
+    __table_args__ = (Index("ix_mart_promotion_ratio_monthly_year_month", "year", "month"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     year = Column(Integer, nullable=False)
@@ -75,3 +127,75 @@ class MartPromotionRatioMonthly(Base):
     used_ratio = Column(Float, nullable=False)  # = used / (used + not_used)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
+class MartCustomerSketch(Base):
+    __tablename__ = "mart_customer_sketch"
+    __table_args__ = (Index("ix_mart_customer_sketch_year_month_cinema_day", "year", "month", "cinema_id", "day"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    day = Column(Integer, nullable=False)  # 0: sketch của cả tháng
+    cinema_id = Column(Integer, nullable=False)  # 0: tất cả các rạp
+    bill_count = Column(Integer, nullable=False)
+    unique_customers = Column(Integer, nullable=False)  # ước lượng HyperLogLog (mart/hll.py)
+    repeat_customers = Column(Integer, nullable=False)  # chính xác: khách có >= 2 bill trong kỳ
+    registers = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class MartCustomerFirstPurchase(Base):
+    __tablename__ = "mart_customer_first_purchase"
+
+    user_id = Column(Integer, primary_key=True)
+    first_date = Column(Date, nullable=False)  # ngày mua đầu tiên -> tháng cohort
+
+class MartCohortRetention(Base):
+    __tablename__ = "mart_cohort_retention"
+    __table_args__ = (Index("ix_mart_cohort_retention_cohort_year_month", "cohort_year", "cohort_month", "year", "month"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    cohort_year = Column(Integer, nullable=False)  # tháng mua đầu tiên của khách
+    cohort_month = Column(Integer, nullable=False)
+    year = Column(Integer, nullable=False)  # tháng hoạt động
+    month = Column(Integer, nullable=False)
+    months_since = Column(Integer, nullable=False)  # 0: chính tháng cohort (= quy mô cohort)
+    active_customers = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class MartForecast(Base):
+    __tablename__ = "mart_forecast"
+    __table_args__ = (Index("ix_mart_forecast_series_date", "series_type", "series_id", "metric", "forecast_date"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    series_type = Column(String, nullable=False)  # film | cinema
+    series_id = Column(Integer, nullable=False)
+    metric = Column(String, nullable=False)  # revenue | attendance
+    forecast_date = Column(Date, nullable=False)
+    value = Column(Float, nullable=False)
+    mae = Column(Float, nullable=False)  # sai số tuyệt đối trung bình của dự báo 1 ngày trên lịch sử
+    alpha = Column(Float, nullable=False)
+    generated_at = Column(DateTime, server_default=func.now())
+
+class MartRefreshState(Base):
+    __tablename__ = "mart_refresh_state"
+
+    job_name = Column(String, primary_key=True)
+    # Mốc etl_dirty_month.marked_at đã xử lý xong (theo đồng hồ của warehouse)
+    last_refreshed_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class MartGeneration(Base):
+    __tablename__ = "mart_generation"
+
+    name = Column(String, primary_key=True)
+    # Tăng sau mỗi lần dữ liệu mart/warehouse thay đổi; cache response theo số này
+    generation = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class MartPayload(Base):
+    __tablename__ = "mart_payload"
+
+    endpoint = Column(String, primary_key=True)
+    # JSON response đã nén gzip, ghi cùng transaction với lần refresh bảng mart nguồn
+    body = Column(LargeBinary, nullable=False)
+    etag = Column(String, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
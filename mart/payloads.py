@@ -0,0 +1,229 @@
+import gzip
+import re
+from typing import List, Optional
+from fastapi import HTTPException, Query, Request, status
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+from mart.mart_model import (
+    MartPayload, MartRevenueByMonth, MartRevenueByCinema, MartTopFilmRevenue, MartTopFilmRevenueByCinema,
+    MartPromotionRatioMonthly, MartPaymentMethodMonthly, MartFilmRatingSummary, MartShowtimeFillRate,
+)
+from mart.response_cache import cached_response, encode_json, etag_response, make_etag
+
+
+GZIP_LEVEL = 6
+MAX_PAGE_SIZE = 1000
+TOP_N_DEFAULT = 5
+TOP_N_MAX = 20  # số phim mỗi tháng (mỗi rạp) được lưu trong bảng top phim
+YEAR_MONTH = re.compile(r"^(\d{4})-(\d{2})$")
+
+
+# Endpoint -> cách dựng payload từ bảng mart:
+#   fields: khóa JSON -> cột, order: khóa sắp xếp (cũng là khóa keyset, phải duy nhất),
+#   filters: tham số lọc -> cột, limit: giới hạn mặc định của payload đầy đủ,
+#   rank: cột xếp hạng của bảng top-N (lọc rank <= n, mặc định TOP_N_DEFAULT).
+# Refresh bảng nào thì ghi lại payload của các endpoint dùng bảng đó.
+PAYLOADS = {
+    "total_revenue_by_month": {
+        "model": MartRevenueByMonth,
+        "fields": {"year": MartRevenueByMonth.year, "month": MartRevenueByMonth.month,
+                   "total_revenue": MartRevenueByMonth.total_revenue},
+        "order": [MartRevenueByMonth.year, MartRevenueByMonth.month],
+        "filters": {},
+    },
+    "total_revenue_by_cinema": {
+        "model": MartRevenueByCinema,
+        "fields": {"cinema_name": MartRevenueByCinema.cinema_name, "total_revenue": MartRevenueByCinema.total_revenue,
+                   "year": MartRevenueByCinema.year, "month": MartRevenueByCinema.month},
+        "order": [MartRevenueByCinema.year, MartRevenueByCinema.month, MartRevenueByCinema.cinema_id],
+        "filters": {"cinema_id": MartRevenueByCinema.cinema_id},
+    },
+    "top_film_revenue": {
+        "model": MartTopFilmRevenue,
+        "fields": {"year": MartTopFilmRevenue.year, "month": MartTopFilmRevenue.month, "rank": MartTopFilmRevenue.rank,
+                   "film_id": MartTopFilmRevenue.film_id, "film_title": MartTopFilmRevenue.film_title,
+                   "total_revenue": MartTopFilmRevenue.total_revenue},
+        "order": [MartTopFilmRevenue.year, MartTopFilmRevenue.month, MartTopFilmRevenue.rank],
+        "filters": {"film_id": MartTopFilmRevenue.film_id},
+        "rank": MartTopFilmRevenue.rank,
+    },
+    "top_film_revenue_by_cinema": {
+        "model": MartTopFilmRevenueByCinema,
+        "fields": {"year": MartTopFilmRevenueByCinema.year, "month": MartTopFilmRevenueByCinema.month,
+                   "cinema_id": MartTopFilmRevenueByCinema.cinema_id, "cinema_name": MartTopFilmRevenueByCinema.cinema_name,
+                   "rank": MartTopFilmRevenueByCinema.rank, "film_id": MartTopFilmRevenueByCinema.film_id,
+                   "film_title": MartTopFilmRevenueByCinema.film_title,
+                   "total_revenue": MartTopFilmRevenueByCinema.total_revenue},
+        "order": [MartTopFilmRevenueByCinema.year, MartTopFilmRevenueByCinema.month,
+                  MartTopFilmRevenueByCinema.cinema_id, MartTopFilmRevenueByCinema.rank],
+        "filters": {"cinema_id": MartTopFilmRevenueByCinema.cinema_id, "film_id": MartTopFilmRevenueByCinema.film_id},
+        "rank": MartTopFilmRevenueByCinema.rank,
+    },
+    "promotion_ratio": {
+        "model": MartPromotionRatioMonthly,
+        "fields": {"year": MartPromotionRatioMonthly.year, "month": MartPromotionRatioMonthly.month,
+                   "used_ratio": MartPromotionRatioMonthly.used_ratio,
+                   "not_used_ratio": MartPromotionRatioMonthly.not_used_count,
+                   "used_count": MartPromotionRatioMonthly.used_count},
+        "order": [MartPromotionRatioMonthly.year, MartPromotionRatioMonthly.month],
+        "filters": {},
+    },
+    "payment_method": {
+        "model": MartPaymentMethodMonthly,
+        "fields": {"payment_method_name": MartPaymentMethodMonthly.payment_method_name,
+                   "year": MartPaymentMethodMonthly.year, "month": MartPaymentMethodMonthly.month,
+                   "transaction_count": MartPaymentMethodMonthly.transaction_count,
+                   "total_revenue": MartPaymentMethodMonthly.total_revenue},
+        "order": [MartPaymentMethodMonthly.year, MartPaymentMethodMonthly.month, MartPaymentMethodMonthly.payment_method_id],
+        "filters": {},
+    },
+    "top_film_rating": {
+        "model": MartFilmRatingSummary,
+        "fields": {"film_title": MartFilmRatingSummary.film_title, "avg_rating": MartFilmRatingSummary.avg_rating,
+                   "total_reviews": MartFilmRatingSummary.total_reviews,
+                   "weighted_rating": MartFilmRatingSummary.weighted_rating,
+                   "median_rating": MartFilmRatingSummary.median_rating,
+                   "rating_1": MartFilmRatingSummary.rating_1, "rating_2": MartFilmRatingSummary.rating_2,
+                   "rating_3": MartFilmRatingSummary.rating_3, "rating_4": MartFilmRatingSummary.rating_4,
+                   "rating_5": MartFilmRatingSummary.rating_5},
+        # Xếp theo điểm Bayes: phim 1 đánh giá 5 điểm không đứng trên phim hàng trăm đánh giá 4.8
+        "order": [MartFilmRatingSummary.weighted_rating, MartFilmRatingSummary.film_id],
+        "descending": True,
+        "filters": {"film_id": MartFilmRatingSummary.film_id},
+        "limit": 10,
+    },
+    "showtime_fill_rate": {
+        "model": MartShowtimeFillRate,
+        "fields": {"year": MartShowtimeFillRate.year, "month": MartShowtimeFillRate.month,
+                   "cinema_id": MartShowtimeFillRate.cinema_id, "cinema_name": MartShowtimeFillRate.cinema_name,
+                   "film_id": MartShowtimeFillRate.film_id, "film_title": MartShowtimeFillRate.film_title,
+                   "showtime_count": MartShowtimeFillRate.showtime_count,
+                   "avg_fill_rate": MartShowtimeFillRate.avg_fill_rate,
+                   "p50_fill_rate": MartShowtimeFillRate.p50_fill_rate,
+                   "p90_fill_rate": MartShowtimeFillRate.p90_fill_rate,
+                   "sold_out_count": MartShowtimeFillRate.sold_out_count},
+        "order": [MartShowtimeFillRate.year, MartShowtimeFillRate.month, MartShowtimeFillRate.cinema_id, MartShowtimeFillRate.film_id],
+        "filters": {"cinema_id": MartShowtimeFillRate.cinema_id, "film_id": MartShowtimeFillRate.film_id},
+    },
+}
+
+
+def parse_year_month(value, name):
+    match = YEAR_MONTH.match(value)
+    if not match or not 1 <= int(match.group(2)) <= 12:
+        raise ValueError(f"{name} phải có dạng YYYY-MM, nhận: {value}")
+    return int(match.group(1)), int(match.group(2))
+
+def mart_query_params(
+    from_: Optional[str] = Query(None, alias="from", description="Tháng bắt đầu, dạng YYYY-MM"),
+    to: Optional[str] = Query(None, description="Tháng kết thúc (tính cả tháng này), dạng YYYY-MM"),
+    cinema_id: Optional[List[int]] = Query(None),
+    film_id: Optional[List[int]] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Số dòng mỗi trang"),
+    after: Optional[str] = Query(None, description="next_cursor của trang trước"),
+):
+    """FastAPI dependency: the filters/page as a hashable tuple (the cache key), or None for the full payload."""
+    if not any([from_, to, cinema_id, film_id, limit, after]):
+        return None
+    try:
+        date_from = parse_year_month(from_, "from") if from_ else None
+        date_to = parse_year_month(to, "to") if to else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="from phải nhỏ hơn hoặc bằng to")
+    return (
+        date_from,
+        date_to,
+        tuple(sorted(set(cinema_id or []))),
+        tuple(sorted(set(film_id or []))),
+        limit,
+        after,
+    )
+
+
+def _parse_cursor(value, order):
+    parts = value.split(",")
+    if len(parts) != len(order):
+        raise ValueError(f"Cursor không hợp lệ: {value}")
+    try:
+        return tuple(column.type.python_type(part) for column, part in zip(order, parts))
+    except ValueError:
+        raise ValueError(f"Cursor không hợp lệ: {value}")
+
+def build_payload(db: Session, endpoint, params=None, n=None):
+    """
+    Query the mart table behind `endpoint`. With `params` (from
+    mart_query_params): year-month range, id filters and a keyset page, whose
+    response also carries `next_cursor` (None on the last page). Top-N tables
+    keep the first `n` ranks of each group (default TOP_N_DEFAULT).
+    """
+    spec = PAYLOADS[endpoint]
+    model, fields, order = spec["model"], spec["fields"], spec["order"]
+    descending = spec.get("descending", False)
+    date_from, date_to, cinema_ids, film_ids, limit, after = params or (None, None, (), (), None, None)
+
+    query = select(*fields.values(), *order)
+    if date_from or date_to:
+        if not hasattr(model, "year"):
+            raise ValueError(f"{endpoint} không lọc được theo tháng")
+        if date_from:
+            query = query.where(tuple_(model.year, model.month) >= date_from)
+        if date_to:
+            query = query.where(tuple_(model.year, model.month) <= date_to)
+    for name, ids in (("cinema_id", cinema_ids), ("film_id", film_ids)):
+        if ids:
+            if name not in spec["filters"]:
+                raise ValueError(f"{endpoint} không hỗ trợ lọc theo {name}")
+            query = query.where(spec["filters"][name].in_(ids))
+    if "rank" in spec:
+        query = query.where(spec["rank"] <= (n or TOP_N_DEFAULT))
+    if after:
+        # Keyset: tiếp tục ngay sau dòng cuối của trang trước, không dùng OFFSET
+        cursor = _parse_cursor(after, order)
+        query = query.where(tuple_(*order) < cursor if descending else tuple_(*order) > cursor)
+    query = query.order_by(*[column.desc() if descending else column for column in order])
+
+    page_size = limit or spec.get("limit")
+    if page_size:
+        query = query.limit(page_size + 1)
+    rows = db.execute(query).all()
+    has_more = page_size is not None and len(rows) > page_size
+    rows = rows[:page_size] if page_size else rows
+
+    payload = {"results": [dict(zip(fields, row[:len(fields)])) for row in rows]}
+    if limit:
+        last = rows[-1][len(fields):] if has_more else None
+        payload["next_cursor"] = ",".join(str(value) for value in last) if last else None
+    return payload
+
+
+def write_payloads(session: Session, MartModel):
+    """Re-serialize the full payloads backed by MartModel. No commit: written with the refresh."""
+    for endpoint, spec in PAYLOADS.items():
+        if spec["model"] is not MartModel:
+            continue
+        body = encode_json(build_payload(session, endpoint))
+        session.merge(MartPayload(endpoint=endpoint, body=gzip.compress(body, compresslevel=GZIP_LEVEL), etag=make_etag(body)))
+
+
+def payload_response(request: Request, db: Session, endpoint, params=None, n=None):
+    """
+    Serve the stored full payload with a single primary-key fetch: gzip bytes
+    as-is when the client accepts gzip, decompressed otherwise. Filtered,
+    paginated or non-default top-N requests, and endpoints not refreshed yet,
+    are queried live through the response cache.
+    """
+    n = n or TOP_N_DEFAULT
+    stored = params is None and n == TOP_N_DEFAULT
+    payload = db.get(MartPayload, endpoint) if stored else None
+    if payload is None:
+        try:
+            return cached_response(request, db, (params, n), lambda: build_payload(db, endpoint, params, n))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        # ETag strong phải khác nhau giữa hai dạng mã hóa của cùng nội dung
+        return etag_response(request, payload.body, payload.etag[:-1] + '-gz"',
+                             {"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+    return etag_response(request, gzip.decompress(payload.body), payload.etag, {"Vary": "Accept-Encoding"})
@@ -0,0 +1,97 @@
+from warehouse.warehouse_models import (
+    DimCinema, DimDate, DimFilm, DimShowtime, DimTime, FactRevenue, FactShowtimeFillRate,
+)
+from warehouse.partitions import add_months
+from sqlalchemy import func, or_, and_, true, cast, select, Integer
+from datetime import date
+
+# Truy vấn của các job mart còn đọc thẳng bảng fact (mart/analysis.py).
+# Tách khỏi job để warehouse/plan_check.py EXPLAIN đúng câu lệnh mà job chạy;
+# module này không cần cấu hình ứng dụng, chỉ cần model warehouse.
+
+
+def month_filter(date_column, months):
+    """Date-range predicate covering `months` (None = all), written so the planner can prune partitions."""
+    if months is None:
+        return true()
+    return or_(*[
+        and_(date_column >= date(year, month, 1), date_column < add_months(date(year, month, 1), 1))
+        for year, month in sorted(months)
+    ])
+
+
+def showtime_fill_rate_query(months):
+    # Percentile không cộng dồn được nên đọc thẳng bảng fact, một lượt GROUP BY cho mỗi lần refresh
+    cinema_id = func.coalesce(FactShowtimeFillRate.cinema_id, 0)
+    return (
+        select(
+            DimDate.year,
+            DimDate.month,
+            cinema_id,
+            func.coalesce(DimCinema.name, "Không xác định"),
+            FactShowtimeFillRate.film_id,
+            DimFilm.title,
+            func.count(),
+            func.avg(FactShowtimeFillRate.fill_rate),
+            func.percentile_cont(0.5).within_group(FactShowtimeFillRate.fill_rate),
+            func.percentile_cont(0.9).within_group(FactShowtimeFillRate.fill_rate),
+            func.count().filter(FactShowtimeFillRate.booked_seats >= FactShowtimeFillRate.total_seats)
+        )
+        .select_from(FactShowtimeFillRate)
+        .join(DimDate, DimDate.date_id == FactShowtimeFillRate.date_id)
+        .join(DimFilm, DimFilm.film_id == FactShowtimeFillRate.film_id)
+        .outerjoin(DimCinema, DimCinema.cinema_id == FactShowtimeFillRate.cinema_id)
+        .where(month_filter(FactShowtimeFillRate.date_id, months))
+        .group_by(DimDate.year, DimDate.month, cinema_id, DimCinema.name, FactShowtimeFillRate.film_id, DimFilm.title)
+    )
+
+
+def fill_rate_heatmap_query(months):
+    cinema_id = func.coalesce(FactShowtimeFillRate.cinema_id, 0)
+    weekday = cast(func.extract("isodow", FactShowtimeFillRate.date_id), Integer)
+    start_time_id = cast(func.extract("hour", DimShowtime.start_time) * 60 + func.extract("minute", DimShowtime.start_time), Integer)
+    return (
+        select(
+            DimDate.year,
+            DimDate.month,
+            cinema_id,
+            func.coalesce(DimCinema.name, "Không xác định"),
+            weekday,
+            DimTime.hour,
+            func.count(),
+            func.sum(FactShowtimeFillRate.fill_rate)
+        )
+        .select_from(FactShowtimeFillRate)
+        .join(DimDate, DimDate.date_id == FactShowtimeFillRate.date_id)
+        .join(DimShowtime, DimShowtime.showtime_id == FactShowtimeFillRate.showtime_id)
+        .join(DimTime, DimTime.time_id == start_time_id)
+        .outerjoin(DimCinema, DimCinema.cinema_id == FactShowtimeFillRate.cinema_id)
+        .where(month_filter(FactShowtimeFillRate.date_id, months))
+        .group_by(DimDate.year, DimDate.month, cinema_id, DimCinema.name, weekday, DimTime.hour)
+    )
+
+
+def customer_sketch_query(months):
+    # (ngày, rạp, khách, số bill) của các tháng cần tính; job gọi từng tháng một
+    return (
+        select(
+            FactRevenue.date_id,
+            FactRevenue.cinema_id,
+            FactRevenue.user_id,
+            func.count()
+        )
+        .where(month_filter(FactRevenue.date_id, months),
+               FactRevenue.user_id.isnot(None), FactRevenue.cinema_id.isnot(None))
+        .group_by(FactRevenue.date_id, FactRevenue.cinema_id, FactRevenue.user_id)
+    )
+
+
+def cohort_activity_query(months):
+    # Khách hoạt động theo tháng cùng ngày mua sớm nhất trong tháng đó: chỉ đọc các tháng cần tính
+    return (
+        select(DimDate.year, DimDate.month, FactRevenue.user_id, func.min(FactRevenue.date_id))
+        .select_from(FactRevenue)
+        .join(DimDate, DimDate.date_id == FactRevenue.date_id)
+        .where(month_filter(FactRevenue.date_id, months), FactRevenue.user_id.isnot(None))
+        .group_by(DimDate.year, DimDate.month, FactRevenue.user_id)
+    )
@@ -0,0 +1,34 @@
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from mart.mart_model import MartRefreshState, MartGeneration
+
+
+GENERATION_NAME = "mart"
+
+
+def get_last_refreshed_at(session: Session, job_name: str):
+    state = session.get(MartRefreshState, job_name)
+    return state.last_refreshed_at if state else None  # None: chưa refresh lần nào -> tính lại toàn bộ
+
+def set_last_refreshed_at(session: Session, job_name: str, refreshed_at: datetime):
+    # Không commit: mốc phải được ghi cùng transaction với dữ liệu mart vừa thay
+    session.merge(MartRefreshState(job_name=job_name, last_refreshed_at=refreshed_at))
+
+def clear_refresh_state(session: Session, job_names):
+    # Xóa mốc -> lần chạy kế tiếp của các job này sẽ tính lại toàn bộ
+    session.query(MartRefreshState).filter(MartRefreshState.job_name.in_(list(job_names))).delete(synchronize_session=False)
+    session.commit()
+
+
+def get_generation(session: Session):
+    return session.query(MartGeneration.generation).filter(MartGeneration.name == GENERATION_NAME).scalar() or 0
+
+def bump_generation(session: Session):
+    # Không commit: tăng cùng transaction với dữ liệu vừa thay để cache không giữ bản cũ dưới số mới
+    stmt = insert(MartGeneration).values(name=GENERATION_NAME, generation=1)
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[MartGeneration.name],
+        set_={"generation": MartGeneration.generation + 1, "updated_at": func.now()},
+    ))
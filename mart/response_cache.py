@@ -0,0 +1,59 @@
+import hashlib
+import json
+from datetime import date
+from decimal import Decimal
+from fastapi import Request, Response, status
+from sqlalchemy.orm import Session
+from mart.cache import TTLCache
+from mart.refresh_state import get_generation
+
+
+# Khóa cache gồm cả generation nên refresh xong là tự hết hạn; TTL chỉ để dọn bộ nhớ
+RESPONSE_TTL = 3600
+response_cache = TTLCache(max_entries=512, ttl=RESPONSE_TTL)
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # sum() trên cột bigint trả về numeric
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Không serialize được kiểu {type(value).__name__}")
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    # If-None-Match so khớp yếu: bỏ tiền tố W/ của client
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def encode_json(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+def make_etag(body):
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+def etag_response(request: Request, body, etag, headers=None):
+    """200 with `body` or 304 if the client's If-None-Match already has `etag`."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache", **(headers or {})}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def cached_response(request: Request, mart_db: Session, params, build):
+    """
+    Serve `build()` (a JSON-able payload) from the in-process cache keyed by
+    (path, params, mart generation). Responses carry a strong ETag over the
+    body; a matching If-None-Match gets 304 without touching the cache body.
+    """
+    # Đọc generation trước dữ liệu: nếu refresh chen giữa thì chỉ cache dữ liệu mới dưới số cũ
+    key = (request.url.path, params, get_generation(mart_db))
+    entry = response_cache.get(key)
+    if entry is None:
+        body = encode_json(build())
+        entry = (body, make_etag(body))
+        response_cache.set(key, entry)
+    return etag_response(request, *entry)
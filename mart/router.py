@@ -1,50 +1,128 @@
-from fastapi import status, HTTPException, Depends, APIRouter
+from fastapi import status, HTTPException, Depends, APIRouter, Query, Request
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 from mart.database import get_db
 import mart.mart_model as model
+from datetime import date
+from typing import List, Optional
+from warehouse.database import get_db as get_warehouse_db
+from mart.cube import normalize_query, run_cube_query
+from mart.customers import query_unique_customers
+from mart.forecast import query_forecast
+from mart.heatmap import query_fill_rate_heatmap
+from mart.cohorts import query_cohort_retention
+from mart.response_cache import cached_response
+from mart.payloads import payload_response, mart_query_params, parse_year_month, TOP_N_DEFAULT, TOP_N_MAX
 router = APIRouter(prefix="/visualization", tags=["visualization"])
 @router.get("/total_revenue_by_month",status_code=status.HTTP_200_OK)
-def get_revenue_by_month(db: Session = Depends(get_db)):
-    results= db.query(model.MartRevenueByMonth.year,model.MartRevenueByMonth.month,model.MartRevenueByMonth.total_revenue).all()
-    results_dict = [{"year": year, "month": month, "total_revenue": total_revenue} for year, month, total_revenue in results]
-    
-    return {"results": results_dict}
+def get_revenue_by_month(request: Request, params: Optional[tuple] = Depends(mart_query_params), db: Session = Depends(get_db)):
+    return payload_response(request, db, "total_revenue_by_month", params)
 @router.get("/total_revenue_by_cinema",status_code=status.HTTP_200_OK)
-def get_revenue_by_cinema(db: Session = Depends(get_db)):
-    results= db.query(model.MartRevenueByCinema.cinema_name,model.MartRevenueByCinema.total_revenue,model.MartRevenueByCinema.year,model.MartRevenueByCinema.month).all()
-    results_dict = [{"cinema_name": cinema_name, "total_revenue": total_revenue,"year":year,"month":month
-                     } for cinema_name, total_revenue, year ,month in results]
-    
-    return {"results": results_dict}
+def get_revenue_by_cinema(request: Request, params: Optional[tuple] = Depends(mart_query_params), db: Session = Depends(get_db)):
+    return payload_response(request, db, "total_revenue_by_cinema", params)
 @router.get("/top_film_revenue",status_code=status.HTTP_200_OK)
-def get_revenue_by_cinema(db: Session = Depends(get_db)):
-    results= db.query(model.MartTopFilmRevenue.film_title,model.MartTopFilmRevenue.total_revenue,model.MartTopFilmRevenue.year,model.MartTopFilmRevenue.month).all()
-    results_dict = [{"cinema_name": film_title, "total_revenue": total_revenue,"year":year,"month":month
-                     } for film_title, total_revenue, year ,month in results]
-    
-    return {"results": results_dict}
+def get_top_film_revenue(request: Request, n: int = Query(TOP_N_DEFAULT, ge=1, le=TOP_N_MAX), params: Optional[tuple] = Depends(mart_query_params), db: Session = Depends(get_db)):
+    return payload_response(request, db, "top_film_revenue", params, n)
+@router.get("/top_film_revenue_by_cinema",status_code=status.HTTP_200_OK)
+def get_top_film_revenue_by_cinema(request: Request, n: int = Query(TOP_N_DEFAULT, ge=1, le=TOP_N_MAX), params: Optional[tuple] = Depends(mart_query_params), db: Session = Depends(get_db)):
+    return payload_response(request, db, "top_film_revenue_by_cinema", params, n)
 @router.get("/promotion_ratio", status_code=status.HTTP_200_OK)
-def get_promotion_ratio(db: Session = Depends(get_db)):
-
-    results = db.query(model.MartPromotionRatioMonthly).all()
-
-  
-    results_dict = [
-        {"year": result.year, "month": result.month, "used_ratio": result.used_ratio,"not_used_ratio": result.not_used_count,"used_count": result.used_count}
-        for result in results
-    ]
-    
-    return {"results": results_dict}
+def get_promotion_ratio(request: Request, params: Optional[tuple] = Depends(mart_query_params), db: Session = Depends(get_db)):
+    return payload_response(request, db, "promotion_ratio", params)
 @router.get("/payment_method",status_code=status.HTTP_200_OK)
-def get_payment_method(db: Session = Depends(get_db)):
-    results= db.query(model.MartPaymentMethodMonthly).all()
-    results_dict = [{"payment_method_name":result.payment_method_name,"year":result.year,"month":result.month,"transaction_count":result.transaction_count,"total_revenue":result.total_revenue} for result in results]
-    
-    return {"results": results_dict}
+def get_payment_method(request: Request, params: Optional[tuple] = Depends(mart_query_params), db: Session = Depends(get_db)):
+    return payload_response(request, db, "payment_method", params)
 @router.get("/top_film_rating",status_code=status.HTTP_200_OK)
-def get_top_film_rating(db: Session = Depends(get_db)):
-    results=db.query(model.MartFilmRatingSummary).order_by(model.MartFilmRatingSummary.avg_rating.desc()).limit(10).all()
-    results_dict = [{"film_title":result.film_title,"avg_rating":result.avg_rating,"total_reviews":result.total_reviews} for result in results]
-    return {"results": results_dict}
\ No newline at end of file
+def get_top_film_rating(request: Request, params: Optional[tuple] = Depends(mart_query_params), db: Session = Depends(get_db)):
+    return payload_response(request, db, "top_film_rating", params)
+@router.get("/showtime_fill_rate",status_code=status.HTTP_200_OK)
+def get_showtime_fill_rate(request: Request, params: Optional[tuple] = Depends(mart_query_params), db: Session = Depends(get_db)):
+    return payload_response(request, db, "showtime_fill_rate", params)
+
+@router.get("/fill_rate_heatmap", status_code=status.HTTP_200_OK)
+def get_fill_rate_heatmap(
+    request: Request,
+    from_: Optional[str] = Query(None, alias="from", description="Tháng bắt đầu, dạng YYYY-MM"),
+    to: Optional[str] = Query(None, description="Tháng kết thúc (tính cả tháng này), dạng YYYY-MM"),
+    cinema_id: Optional[List[int]] = Query(None),
+    db: Session = Depends(get_db),
+):
+    # Trả về lưới 7 x 24 (thứ x giờ) cho mỗi rạp, front end không phải pivot
+    try:
+        params = (parse_year_month(from_, "from") if from_ else None, parse_year_month(to, "to") if to else None,
+                  tuple(sorted(set(cinema_id or []))))
+        return cached_response(request, db, params, lambda: query_fill_rate_heatmap(db, *params))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/cohort_retention", status_code=status.HTTP_200_OK)
+def get_cohort_retention(
+    request: Request,
+    from_: Optional[str] = Query(None, alias="from", description="Tháng cohort đầu tiên, dạng YYYY-MM"),
+    to: Optional[str] = Query(None, description="Tháng cohort cuối cùng, dạng YYYY-MM"),
+    max_months: Optional[int] = Query(None, ge=0, description="Số tháng tối đa sau tháng cohort"),
+    db: Session = Depends(get_db),
+):
+    try:
+        params = (parse_year_month(from_, "from") if from_ else None, parse_year_month(to, "to") if to else None, max_months)
+        return cached_response(request, db, params, lambda: query_cohort_retention(db, *params))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/unique_customers", status_code=status.HTTP_200_OK)
+def get_unique_customers(
+    request: Request,
+    date_from: date,
+    date_to: date,
+    cinema_id: Optional[List[int]] = Query(None),
+    grain: str = Query("month", description="month: theo từng tháng, total: cả khoảng"),
+    db: Session = Depends(get_db),
+):
+    # Ước lượng HyperLogLog: unique_customers sai số tương đối ~ standard_error (1.6%)
+    params = (date_from, date_to, tuple(sorted(set(cinema_id or []))), grain)
+    try:
+        return cached_response(request, db, params, lambda: query_unique_customers(db, *params))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/forecast", status_code=status.HTTP_200_OK)
+def get_forecast(
+    request: Request,
+    series_type: str = Query("film", description="film | cinema"),
+    metric: str = Query("revenue", description="revenue | attendance"),
+    series_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    # Bảng mart_forecast được ghi lại mỗi đêm (mart/forecast.py)
+    params = (series_type, series_id, metric)
+    try:
+        return cached_response(request, db, params, lambda: query_forecast(db, series_type, series_id, metric))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/cube", status_code=status.HTTP_200_OK)
+def get_cube(
+    request: Request,
+    dimensions: str = Query("", description="Danh sách chiều, ví dụ: month,cinema,genre (day|week|month|quarter|year, cinema, film, genre, payment_method, purchase_type)"),
+    measures: str = Query(..., description="Danh sách measure, ví dụ: revenue,bill_count"),
+    cinema_id: Optional[List[int]] = Query(None),
+    film_id: Optional[List[int]] = Query(None),
+    genre_id: Optional[List[int]] = Query(None),
+    payment_method_id: Optional[List[int]] = Query(None),
+    purchase_type_id: Optional[List[int]] = Query(None),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    limit: int = 1000,
+    db: Session = Depends(get_warehouse_db),
+    mart_db: Session = Depends(get_db),
+):
+    filters = {
+        "cinema": cinema_id, "film": film_id, "genre": genre_id,
+        "payment_method": payment_method_id, "purchase_type": purchase_type_id,
+    }
+    try:
+        normalized = normalize_query(dimensions, measures, filters, date_from, date_to, limit)
+        return cached_response(request, mart_db, normalized, lambda: run_cube_query(db, normalized))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
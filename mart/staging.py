@@ -0,0 +1,101 @@
+import io
+import logging
+from sqlalchemy import inspect, text
+
+STAGING_SUFFIX = "_staging"
+SWAP_LOCK_TIMEOUT = "5s"  # Không chờ mãi nếu có truy vấn API dài đang giữ bảng
+
+
+def _copy_value(value):
+    # Định dạng text của COPY: \N là NULL, escape các ký tự điều khiển
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "\\\\x" + bytes(value).hex()  # bytea dạng hex, dấu \ phải escape
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+def copy_rows(connection, table_name, columns, rows):
+    """Bulk-load `rows` (tuples ordered like `columns`) into `table_name` with COPY FROM STDIN."""
+    buffer = io.StringIO()
+    count = 0
+    for row in rows:
+        buffer.write("\t".join(_copy_value(v) for v in row))
+        buffer.write("\n")
+        count += 1
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table_name} ({', '.join(columns)}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+    return count
+
+
+def swap_table(connection, MartModel, columns, rows):
+    """
+    Rebuild a whole mart table: COPY `rows` into a temp staging table, then
+    TRUNCATE the live table and INSERT ... SELECT from staging. Runs inside the
+    caller's transaction, so readers keep seeing the old rows until commit and
+    are only blocked by the final TRUNCATE + INSERT, never by the load. The
+    live table itself is kept (same OID, grants, comments and indexes), so
+    queries queued on it are not broken by the swap.
+    """
+    table = MartModel.__table__
+    staging_name = table.name + STAGING_SUFFIX
+    column_list = ", ".join(columns)
+
+    table.create(connection, checkfirst=True)
+    connection.execute(text(
+        f"CREATE TEMP TABLE {staging_name} ON COMMIT DROP AS SELECT {column_list} FROM {table.name} WITH NO DATA"
+    ))
+    count = copy_rows(connection, staging_name, columns, rows)
+
+    connection.execute(text(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'"))
+    connection.execute(text(f"TRUNCATE {table.name}"))
+    connection.execute(text(f"INSERT INTO {table.name} ({column_list}) SELECT {column_list} FROM {staging_name}"))
+    connection.execute(text(f"DROP TABLE {staging_name}"))
+    connection.execute(text(f"ANALYZE {table.name}"))
+    logging.info(f"Đã swap {staging_name} -> {table.name} ({count} bản ghi).")
+    return count
+
+def replace_rows(connection, MartModel, columns, rows, scope):
+    """
+    Replace the rows of a mart table matching `scope` (a predicate on the
+    table): COPY into a temp table first, then DELETE + INSERT ... SELECT, so
+    the rows are swapped by one statement pair at the end of the transaction.
+    Returns (deleted, inserted).
+    """
+    table = MartModel.__table__
+    temp_name = f"tmp_{table.name}"
+    column_list = ", ".join(columns)
+    connection.execute(text(
+        f"CREATE TEMP TABLE {temp_name} ON COMMIT DROP AS SELECT {column_list} FROM {table.name} WITH NO DATA"
+    ))
+    copy_rows(connection, temp_name, columns, rows)
+    deleted = connection.execute(table.delete().where(scope)).rowcount
+    inserted = connection.execute(text(
+        f"INSERT INTO {table.name} ({column_list}) SELECT {column_list} FROM {temp_name}"
+    )).rowcount
+    return deleted, inserted
+
+
+def drop_outdated_tables(connection, metadata):
+    """
+    Drop mart tables whose live columns no longer match the model. Mart tables
+    are derived data without migrations: the caller clears their refresh state
+    so the next run rebuilds them from the warehouse. Returns the dropped names.
+    """
+    inspector = inspect(connection)
+    dropped = []
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        live = {column["name"] for column in inspector.get_columns(table.name)}
+        if live != {column.name for column in table.columns}:
+            connection.execute(text(f"DROP TABLE {table.name}"))
+            dropped.append(table.name)
+            logging.warning(f"Bảng {table.name} khác định nghĩa model, xóa để tạo lại.")
+    return dropped
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 from user.schemas.user import UserBase
@@ -12,11 +12,11 @@ class RateBase(BaseModel):
 class RateCreate(RateBase):
     user_id: int
     film_id: int
-    point: int
+    point: int = Field(ge=1, le=5)
 
 
 class RateUpdate(RateBase):
-    pass
+    point: int = Field(ge=1, le=5)
 
 
 class RateResponse(RateBase):
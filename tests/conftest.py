@@ -0,0 +1,21 @@
+import os
+import pytest
+from sqlalchemy import create_engine
+
+
+# Test tích hợp chạy trên PostgreSQL thật; database được chỉ định sẽ bị xóa và tạo lại.
+def _scratch_engine(variable):
+    url = os.environ.get(variable)
+    if not url:
+        pytest.skip(f"Cần biến môi trường {variable} trỏ tới một database PostgreSQL scratch")
+    engine = create_engine(url)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture(scope="session")
+def warehouse_engine():
+    yield from _scratch_engine("WAREHOUSE_URL")
+
+@pytest.fixture(scope="session")
+def source_engine():
+    yield from _scratch_engine("SOURCE_URL")
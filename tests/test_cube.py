@@ -0,0 +1,43 @@
+from datetime import date
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from mart.cube import normalize_query, run_cube_query
+from warehouse.matviews import MATERIALIZED_VIEWS, create_materialized_views, refresh_materialized_views
+from warehouse.warehouse_models import Base as WarehouseBase
+
+
+@pytest.fixture
+def warehouse(warehouse_engine):
+    with warehouse_engine.begin() as conn:
+        for name in MATERIALIZED_VIEWS:
+            conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {name}"))
+    WarehouseBase.metadata.drop_all(warehouse_engine)
+    WarehouseBase.metadata.create_all(warehouse_engine)
+    with warehouse_engine.begin() as conn:
+        conn.execute(text("INSERT INTO dim_film (film_id, title) VALUES (1, 'Phim 1'), (2, 'Phim 2')"))
+        conn.execute(text("INSERT INTO dim_genre (genre_id, name) VALUES (1, 'Hành động'), (2, 'Hài')"))
+        # Phim 1 thuộc hai thể loại, phim 2 chỉ thuộc thể loại 2
+        conn.execute(text("INSERT INTO fact_film_genre (film_id, genre_id, point) VALUES (1, 1, 0), (1, 2, 0), (2, 2, 0)"))
+        conn.execute(text(
+            "INSERT INTO agg_daily_revenue (date_id, cinema_id, film_id, payment_method_id, purchase_type_id, bill_count, revenue)"
+            " VALUES ('2024-01-05', 0, 1, 1, 1, 1, 100000), ('2024-01-06', 0, 2, 1, 1, 2, 50000)"
+        ))
+        create_materialized_views(conn)
+    refresh_materialized_views(warehouse_engine)
+    session = sessionmaker(bind=warehouse_engine)()
+    yield session
+    session.close()
+
+
+def _cube(db, dimensions, filters, date_from=None, date_to=None):
+    return run_cube_query(db, normalize_query(dimensions, "revenue", filters, date_from, date_to))
+
+@pytest.mark.parametrize("date_from, date_to", [(None, None), (date(2024, 1, 5), date(2024, 1, 5))], ids=["monthly", "daily"])
+def test_genre_filter_with_genre_dimension_returns_only_the_filtered_genre(warehouse, date_from, date_to):
+    result = _cube(warehouse, "genre", {"genre": [1]}, date_from, date_to)
+    assert [(row["genre_id"], row["revenue"]) for row in result["results"]] == [(1, 100000)]
+
+def test_genre_filter_without_genre_dimension_counts_each_film_once(warehouse):
+    result = _cube(warehouse, "film", {"genre": [2]})
+    assert [(row["film_id"], row["revenue"]) for row in result["results"]] == [(1, 100000), (2, 50000)]
@@ -0,0 +1,208 @@
+from datetime import date, datetime, timezone
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from warehouse.matviews import MATERIALIZED_VIEWS
+from warehouse.partitions import PARTITIONED_FACT_TABLES, ensure_month_partitions
+from warehouse.warehouse_models import Base as WarehouseBase, FactRevenue, FactTicketAnalysis, FactPromotionAnalysis
+
+
+MONTHS = [date(2024, 1, 1), date(2024, 2, 1), date(2024, 3, 1)]
+
+
+@pytest.fixture
+def models(source_engine):
+    # Model nguồn cần cấu hình ứng dụng (configs/conf.py): chỉ import khi có database để chạy
+    from configs.database import Base
+    from user.models.user import User
+    from auth_credential.models.auth_credential import AuthCredential
+    from role.models.role import Role
+    from user_role.models.user_role import UserRole
+    from cinema.models.cinema import Cinema
+    from room.models.room import Room
+    from seat.models.seat import Seat
+    from film.models.film import Film
+    from food.models.food import Food
+    from ticket.models.ticket import Ticket
+    from bill.models.bill import Bill
+    from user_bill.models.user_bill import UserBill
+    from genre.models.genre import Genre
+    from film_genre.models.film_genre import FilmGenre
+    from showtime.models.showtime import Showtime
+    from showtime_seat.models.showtime_seat import ShowtimeSeat
+    from promotion.models.promotion import Promotion
+    from rate.models.rate import Rate
+    from bill_prom.models.bill_prom import BillProm
+    from etl_change_log.models.etl_change_log import ETLChangeLog
+    from warehouse.etl_metadata.models.etl_metadata import ETLMetadata
+
+    Base.metadata.drop_all(source_engine)
+    Base.metadata.create_all(source_engine, tables=[t for t in Base.metadata.sorted_tables if t.name != "etl_metadata"])
+    return locals()
+
+@pytest.fixture
+def warehouse(warehouse_engine, models):
+    with warehouse_engine.begin() as conn:
+        for name in MATERIALIZED_VIEWS:
+            conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {name}"))
+    WarehouseBase.metadata.drop_all(warehouse_engine)
+    WarehouseBase.metadata.create_all(warehouse_engine)
+    models["ETLMetadata"].__table__.drop(warehouse_engine, checkfirst=True)
+    models["ETLMetadata"].__table__.create(warehouse_engine)
+    for table_name in PARTITIONED_FACT_TABLES:
+        ensure_month_partitions(warehouse_engine, table_name, MONTHS)
+    with warehouse_engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO dim_date (date_id, day, month, year, quarter, week, weekday, is_weekend)"
+            " SELECT d::date, extract(day FROM d), extract(month FROM d), extract(year FROM d),"
+            " extract(quarter FROM d), extract(week FROM d), trim(to_char(d, 'Day')), extract(isodow FROM d) >= 6"
+            " FROM generate_series(DATE '2024-01-01', DATE '2024-03-31', interval '1 day') d"
+        ))
+        conn.execute(text("INSERT INTO dim_time (time_id, hour, minute, period) SELECT m, m / 60, m % 60, 'AM' FROM generate_series(0, 1439) m"))
+        conn.execute(text("INSERT INTO dim_payment_method (payment_method_id, method_name) VALUES (1, 'Thanh toán tiền mặt')"))
+        conn.execute(text("INSERT INTO dim_purchase_type (purchase_type_id, type_name) VALUES (1, 'Tại quầy'), (2, 'Online')"))
+        conn.execute(text("INSERT INTO dim_cinema (cinema_id, name, address, phone_number) VALUES (1, 'Rạp 1', 'Địa chỉ 1', '0900000001')"))
+        conn.execute(text("INSERT INTO dim_film (film_id, title) VALUES (1, 'Phim 1')"))
+    return warehouse_engine
+
+@pytest.fixture
+def sessions(source_engine, warehouse):
+    src = sessionmaker(bind=source_engine)()
+    dest = sessionmaker(bind=warehouse)()
+    yield src, dest
+    src.close()
+    dest.close()
+
+
+def _add_bill(src, m, payment_time):
+    src.add_all([
+        m["Cinema"](id=1, name="Rạp 1", address="Địa chỉ 1", phone_number="0900000001"),
+        m["Film"](id=1, title="Phim 1"),
+    ])
+    src.flush()
+    src.add(m["Room"](id=1, name="P1", capacity=10, cinema_id=1))
+    src.flush()
+    src.add_all([
+        m["Seat"](id=1, seat_number="A1", room_id=1),
+        m["Showtime"](id=1, name="Suất 1", start_time=payment_time, film_id=1, room_id=1),
+    ])
+    src.flush()
+    src.add(m["ShowtimeSeat"](id=1, seat_id=1, showtime_id=1))
+    src.add(m["Bill"](id=1, payment_method="Thanh toán tiền mặt", payment_time=payment_time, value=90000))
+    src.flush()
+    src.add(m["Ticket"](id=1, title="Vé", price=90000, bill_id=1, showtime_seat_id=1, created_at=payment_time))
+    src.commit()
+
+def _load(src, dest, m):
+    # warehouse.etl đọc cấu hình ứng dụng (configs.database): import sau fixture models để module vẫn collect được khi không có DB
+    from warehouse.etl import (
+        etl_fact_ticket_analysis_incremental, etl_fact_revenue_incremental, etl_fact_promotion_analysis_incremental,
+        etl_apply_change_log_incremental,
+    )
+    etl_fact_ticket_analysis_incremental(src, dest, m["Ticket"], m["Bill"], FactTicketAnalysis)
+    etl_fact_revenue_incremental(src, dest, m["Bill"], m["Ticket"], m["ShowtimeSeat"], m["Showtime"], m["Room"], FactRevenue)
+    etl_fact_promotion_analysis_incremental(src, dest, m["Bill"], m["BillProm"], FactPromotionAnalysis)
+    etl_apply_change_log_incremental(src, dest, m["ETLChangeLog"], m["Bill"], m["Ticket"], m["ShowtimeSeat"], m["Showtime"],
+                                     m["Room"], m["BillProm"], FactRevenue, FactTicketAnalysis, FactPromotionAnalysis)
+
+def _skip_watermarks(dest):
+    # Như khi các bill mới hơn đã được nạp: chỉ còn change log đưa được thay đổi vào fact
+    dest.execute(text("UPDATE etl_metadata SET last_loaded_time = '2100-01-01' WHERE last_loaded_time IS NOT NULL"))
+    dest.commit()
+
+
+def test_bill_moved_to_a_later_month_keeps_a_single_fact_row(sessions, models):
+    from etl_change_log.utils.etl_change_log import log_changes, OPERATION_UPDATE
+    src, dest = sessions
+    _add_bill(src, models, datetime(2024, 1, 10, 12, tzinfo=timezone.utc))
+    _load(src, dest, models)
+
+    # Sửa payment_time qua router: bill vượt watermark nên được nạp lại, đồng thời có dòng change log
+    bill = src.get(models["Bill"], 1)
+    bill.payment_time = datetime(2024, 2, 20, 12, tzinfo=timezone.utc)
+    log_changes(src, "bills", [1], OPERATION_UPDATE)
+    src.commit()
+    _load(src, dest, models)
+
+    assert dest.execute(text("SELECT bill_id, date_id FROM fact_revenue")).all() == [(1, date(2024, 2, 20))]
+    assert dest.execute(text("SELECT bill_id, date_id FROM fact_promotion_analysis")).all() == [(1, date(2024, 2, 20))]
+    assert dest.execute(text("SELECT date_id, bill_count, revenue FROM agg_daily_revenue WHERE bill_count <> 0")).all() == [
+        (date(2024, 2, 20), 1, 90000)
+    ]
+    assert dest.execute(text("SELECT sum(not_used_count) FROM agg_daily_promotion")).scalar() == 1
+    # Tháng cũ cũng phải được mart tính lại
+    dirty = dest.execute(text("SELECT year, month FROM etl_dirty_month WHERE table_name = 'fact_revenue'")).all()
+    assert {(2024, 1), (2024, 2)} <= set(dirty)
+    # Change log đã được áp dụng (không lỗi trùng khóa) nên watermark tiến lên
+    assert dest.execute(text("SELECT last_loaded_id FROM etl_metadata WHERE table_name = 'etl_change_log'")).scalar() == 1
+
+def test_reloading_an_unchanged_bill_does_not_duplicate_it(sessions, models):
+    src, dest = sessions
+    _add_bill(src, models, datetime(2024, 3, 5, 12, tzinfo=timezone.utc))
+    _load(src, dest, models)
+    # Quay watermark lại như khi một lần chạy trước bị lỗi giữa chừng
+    dest.execute(text("UPDATE etl_metadata SET last_loaded_time = '2000-01-01'"))
+    dest.commit()
+    _load(src, dest, models)
+
+    assert dest.execute(text("SELECT count(*) FROM fact_revenue")).scalar() == 1
+    assert dest.execute(text("SELECT count(*) FROM fact_promotion_analysis")).scalar() == 1
+    assert dest.execute(text("SELECT sum(bill_count) FROM agg_daily_revenue")).scalar() == 1
+
+def test_cancelled_bill_moved_back_to_paid_is_inserted(sessions, models):
+    from etl_change_log.utils.etl_change_log import log_changes, OPERATION_UPDATE
+    src, dest = sessions
+    _add_bill(src, models, datetime(2024, 1, 10, 12, tzinfo=timezone.utc))
+    src.get(models["Bill"], 1).status = models["Bill"].STATUS_CANCELLED
+    src.commit()
+    _load(src, dest, models)
+    assert dest.execute(text("SELECT count(*) FROM fact_revenue")).scalar() == 0
+
+    src.get(models["Bill"], 1).status = models["Bill"].STATUS_PAID
+    log_changes(src, "bills", [1], OPERATION_UPDATE)
+    src.commit()
+    _skip_watermarks(dest)
+    _load(src, dest, models)
+
+    assert dest.execute(text("SELECT bill_id, date_id FROM fact_revenue")).all() == [(1, date(2024, 1, 10))]
+    assert dest.execute(text("SELECT bill_id FROM fact_promotion_analysis")).all() == [(1,)]
+    assert dest.execute(text("SELECT ticket_id, bill_id FROM fact_ticket_analysis")).all() == [(1, 1)]
+    assert dest.execute(text("SELECT sum(bill_count) FROM agg_daily_revenue")).scalar() == 1
+
+def test_customer_linked_after_load_reaches_fact_revenue(sessions, models):
+    from etl_change_log.utils.etl_change_log import log_changes, OPERATION_UPDATE
+    src, dest = sessions
+    _add_bill(src, models, datetime(2024, 1, 10, 12, tzinfo=timezone.utc))
+    _load(src, dest, models)
+    assert dest.execute(text("SELECT user_id FROM fact_revenue")).scalar() is None
+
+    src.add(models["User"](id=7, username="khach7", full_name="Khách 7"))
+    src.flush()
+    src.add(models["UserBill"](user_id=7, bill_id=1))
+    log_changes(src, "bills", [1], OPERATION_UPDATE)
+    src.commit()
+    _load(src, dest, models)
+
+    assert dest.execute(text("SELECT bill_id, user_id FROM fact_revenue")).all() == [(1, 7)]
+
+def test_ticket_moved_to_another_bill_follows_it(sessions, models):
+    from etl_change_log.utils.etl_change_log import log_changes, OPERATION_UPDATE
+    src, dest = sessions
+    _add_bill(src, models, datetime(2024, 1, 10, 12, tzinfo=timezone.utc))
+    src.add(models["Bill"](id=2, payment_method="Thanh toán tiền mặt", payment_time=datetime(2024, 2, 3, 9, tzinfo=timezone.utc), value=50000))
+    src.commit()
+    _load(src, dest, models)
+    assert dest.execute(text("SELECT bill_id FROM fact_revenue")).all() == [(1,)]  # bill 2 chưa có vé
+
+    src.get(models["Ticket"], 1).bill_id = 2
+    log_changes(src, "tickets", [1], OPERATION_UPDATE)
+    src.commit()
+    _skip_watermarks(dest)
+    _load(src, dest, models)
+
+    # Ngày của fact vé theo created_at của vé, như loader; bill và doanh thu đi theo bill mới
+    assert dest.execute(text("SELECT ticket_id, bill_id, date_id FROM fact_ticket_analysis")).all() == [(1, 2, date(2024, 1, 10))]
+    assert dest.execute(text("SELECT bill_id, date_id, value FROM fact_revenue")).all() == [(2, date(2024, 2, 3), 50000)]
+    assert dest.execute(text("SELECT date_id, bill_count, revenue FROM agg_daily_revenue WHERE bill_count <> 0")).all() == [
+        (date(2024, 2, 3), 1, 50000)
+    ]
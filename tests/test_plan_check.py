@@ -0,0 +1,20 @@
+import pytest
+from warehouse.partitions import add_months
+from warehouse.plan_check import MART_QUERIES, check_query_plan
+from warehouse.synthetic import build_synthetic_warehouse, START_DATE, MONTHS
+
+
+SCALE = 0.05  # 5 000 bill trên 24 tháng: đủ để planner có thống kê thật cho từng partition
+
+
+@pytest.fixture(scope="module")
+def synthetic_warehouse(warehouse_engine):
+    build_synthetic_warehouse(warehouse_engine, scale=SCALE)
+    return warehouse_engine
+
+@pytest.mark.parametrize("month", [START_DATE, add_months(START_DATE, MONTHS // 2)], ids=str)
+@pytest.mark.parametrize("name", MART_QUERIES)
+def test_mart_query_reads_only_the_refreshed_month(synthetic_warehouse, name, month):
+    with synthetic_warehouse.connect() as conn:
+        violations, _ = check_query_plan(conn, name, MART_QUERIES[name], month)
+    assert violations == []
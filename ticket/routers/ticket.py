@@ -9,6 +9,7 @@ from configs.authentication import get_current_user
 from showtime_seat.models.showtime_seat import ShowtimeSeat
 from ticket.models.ticket import Ticket
 from ticket.schemas.ticket import *
+from etl_change_log.utils.etl_change_log import log_changes, OPERATION_DELETE, OPERATION_UPDATE
 import math
 
 
@@ -260,6 +261,7 @@ async def update_ticket(
         ticket_data.price = ticket.price
         ticket_data.showtime_seat_id = ticket.showtime_seat_id
 
+        log_changes(db, "tickets", [ticket_id], OPERATION_UPDATE)
         db.commit()
 
         return JSONResponse(
@@ -289,6 +291,7 @@ async def delete_ticket(
                 detail="Ticket not found"
             )
 
+        log_changes(db, "tickets", [ticket_id], OPERATION_DELETE)
         db.delete(ticket)
         db.commit()
 
@@ -319,7 +322,9 @@ async def delete_many_tickets(
                 detail="Tickets not found"
             )
 
-        db.delete(tickets)
+        log_changes(db, "tickets", [ticket.id for ticket in tickets], OPERATION_DELETE)
+        for ticket in tickets:
+            db.delete(ticket)
         db.commit()
 
         return JSONResponse(
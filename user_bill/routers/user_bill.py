@@ -5,6 +5,7 @@ from sqlalchemy.exc import SQLAlchemyError
 from bill.models.bill import Bill
 from configs.authentication import get_current_user
 from configs.database import get_db
+from etl_change_log.utils.etl_change_log import log_changes, OPERATION_UPDATE
 from user.models.user import User
 from user_bill.models.user_bill import UserBill
 from user_bill.schemas.user_bill import *
@@ -112,6 +113,8 @@ def create_user_bill(
         )
         
         db.add(user_bill)
+        # user_id của fact doanh thu lấy từ user_bills: để ETL dựng lại fact của bill
+        log_changes(db, "bills", [request.bill_id], OPERATION_UPDATE)
         db.commit()
         
         return JSONResponse(
@@ -153,6 +156,7 @@ def update_user_bill(
                 content={"message": "Bill not found"},
                 status_code=status.HTTP_404_NOT_FOUND)
         
+        log_changes(db, "bills", [user_bill.bill_id, request.bill_id], OPERATION_UPDATE)
         user_bill.user_id = request.user_id
         user_bill.bill_id = request.bill_id
         
@@ -184,6 +188,7 @@ def delete_user_bill(
             )
         
         db.delete(user_bill)
+        log_changes(db, "bills", [user_bill.bill_id], OPERATION_UPDATE)
         db.commit()
         
         return JSONResponse(
@@ -213,6 +218,7 @@ def delete_many_user_bill(
         
         for user_bill in user_bills:
             db.delete(user_bill)
+        log_changes(db, "bills", [user_bill.bill_id for user_bill in user_bills], OPERATION_UPDATE)
         db.commit()
         
         return JSONResponse(
@@ -0,0 +1,118 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from sqlalchemy import tuple_
+from warehouse.etl_metadata.utils.etl_metadata import get_batch_size, update_batch_size
+
+try:
+    import psutil
+except ImportError:  # psutil không bắt buộc, trên Linux đọc /proc thay thế
+    psutil = None
+
+
+DEFAULT_BATCH_SIZE = 1000
+MIN_BATCH_SIZE = 100
+MAX_BATCH_SIZE = 50000
+TARGET_BATCH_SECONDS = 2.0   # Thời gian mong muốn cho một batch (fetch + transform + write)
+MEMORY_LIMIT_MB = 1024       # Trần RSS của tiến trình ETL
+MAX_GROWTH = 2.0             # Mỗi lần điều chỉnh không tăng/giảm quá 2 lần
+
+
+def get_process_rss():
+    """Return the resident set size of the current process in bytes, or None if unknown."""
+    if psutil is not None:
+        return psutil.Process(os.getpid()).memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class AdaptiveBatchSizer:
+    """
+    Per-loader batch size controller.
+
+    Measures fetch/transform/write time of every batch plus process RSS and
+    moves the batch size toward TARGET_BATCH_SECONDS, halving it whenever the
+    memory ceiling is crossed. The tuned size is kept in etl_metadata.batch_size.
+    """
+
+    def __init__(self, table_name, initial_size=DEFAULT_BATCH_SIZE,
+                 target_seconds=TARGET_BATCH_SECONDS, memory_limit_mb=MEMORY_LIMIT_MB,
+                 min_size=MIN_BATCH_SIZE, max_size=MAX_BATCH_SIZE):
+        self.table_name = table_name
+        self.target_seconds = target_seconds
+        self.memory_limit = memory_limit_mb * 1024 * 1024
+        self.min_size = min_size
+        self.max_size = max_size
+        self.batch_size = self._clamp(initial_size)
+        self.total_rows = 0
+        self.total_batches = 0
+        self._timings = {"fetch": 0.0, "transform": 0.0, "write": 0.0}
+
+    @classmethod
+    def from_metadata(cls, session, table_name, **kwargs):
+        saved_size = get_batch_size(session, table_name)
+        if saved_size:
+            kwargs["initial_size"] = saved_size
+        return cls(table_name, **kwargs)
+
+    def _clamp(self, size):
+        return max(self.min_size, min(self.max_size, int(size)))
+
+    @contextmanager
+    def timed(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._timings[phase] += time.perf_counter() - start
+
+    def batches(self, query, order_by):
+        """
+        Yield lists of rows of the ORM `query`, in `order_by` order. Every batch
+        is its own LIMIT batch_size query after the last key seen (keyset), so
+        a size chosen by _adjust applies to the very next fetch.
+        """
+        last_key = None
+        while True:
+            self._timings = {"fetch": 0.0, "transform": 0.0, "write": 0.0}
+            with self.timed("fetch"):
+                page = query if last_key is None else query.filter(tuple_(*order_by) > last_key)
+                batch = page.order_by(*order_by).limit(self.batch_size).all()
+            if not batch:
+                return
+            yield batch
+            last_key = tuple(getattr(batch[-1], column.key) for column in order_by)
+            # Batch đã ghi xong: bỏ khỏi identity map để bộ nhớ không tăng theo số batch
+            query.session.expunge_all()
+            self._adjust(len(batch))
+
+    def _adjust(self, rows):
+        self.total_rows += rows
+        self.total_batches += 1
+        elapsed = sum(self._timings.values())
+        rss = get_process_rss()
+        old_size = self.batch_size
+
+        if rss is not None and rss > self.memory_limit:
+            self.batch_size = self._clamp(old_size / MAX_GROWTH)
+        elif rows < old_size:
+            # Batch cuối chưa đầy, số liệu không đại diện
+            return
+        elif elapsed > 0:
+            ratio = self.target_seconds / elapsed
+            ratio = max(1 / MAX_GROWTH, min(MAX_GROWTH, ratio))
+            self.batch_size = self._clamp(old_size * ratio)
+
+        logging.debug(
+            f"[{self.table_name}] batch {self.total_batches}: {rows} dòng, "
+            f"fetch={self._timings['fetch']:.3f}s transform={self._timings['transform']:.3f}s "
+            f"write={self._timings['write']:.3f}s rss={rss} -> batch_size {old_size} => {self.batch_size}"
+        )
+
+    def save(self, session):
+        update_batch_size(session, self.table_name, self.batch_size)
+        logging.info(f"[{self.table_name}] Lưu batch_size đã tinh chỉnh: {self.batch_size} ({self.total_rows} dòng / {self.total_batches} batch).")
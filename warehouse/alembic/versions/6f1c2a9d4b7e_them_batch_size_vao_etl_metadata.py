@@ -0,0 +1,28 @@
+"""them batch_size vao etl_metadata
+
+Revision ID: 6f1c2a9d4b7e
+Revises: 44448b0c00eb
+Create Date: 2026-10-19 09:12:40.518233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6f1c2a9d4b7e'
+down_revision: Union[str, None] = '44448b0c00eb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('etl_metadata', sa.Column('batch_size', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('etl_metadata', 'batch_size')
@@ -0,0 +1,32 @@
+"""them cinema_id cho fact_showtime_fillrate
+
+Revision ID: a2c6e9f17b38
+Revises: f8b27d4e6a13
+Create Date: 2026-10-19 18:21:40.517203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a2c6e9f17b38'
+down_revision: Union[str, None] = 'f8b27d4e6a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Warehouse không có dim phòng chiếu nên không backfill được: các dòng cũ để NULL
+    # đến khi chạy lại ETL đầy đủ fact_showtime_fillrate
+    op.add_column('fact_showtime_fillrate', sa.Column('cinema_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(None, 'fact_showtime_fillrate', 'dim_cinema', ['cinema_id'], ['cinema_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('fact_showtime_fillrate_cinema_id_fkey', 'fact_showtime_fillrate', type_='foreignkey')
+    op.drop_column('fact_showtime_fillrate', 'cinema_id')
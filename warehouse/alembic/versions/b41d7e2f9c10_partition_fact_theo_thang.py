@@ -0,0 +1,125 @@
+"""partition fact theo thang
+
+Revision ID: b41d7e2f9c10
+Revises: 6f1c2a9d4b7e
+Create Date: 2026-10-19 11:20:05.904117
+
+"""
+import logging
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41d7e2f9c10'
+down_revision: Union[str, None] = '6f1c2a9d4b7e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# bảng -> (khóa chính cũ, khóa ngoại)
+FACT_TABLES = {
+    "fact_revenue": ("bill_id", {
+        "date_id": "dim_date(date_id)",
+        "time_id": "dim_time(time_id)",
+        "film_id": "dim_film(film_id)",
+        "cinema_id": "dim_cinema(cinema_id)",
+        "payment_method_id": "dim_payment_method(payment_method_id)",
+        "purchase_type_id": "dim_purchase_type(purchase_type_id)",
+    }),
+    "fact_ticket_analysis": ("ticket_id", {
+        "date_id": "dim_date(date_id)",
+        "time_id": "dim_time(time_id)",
+        "payment_method_id": "dim_payment_method(payment_method_id)",
+        "purchase_type_id": "dim_purchase_type(purchase_type_id)",
+    }),
+    "fact_film_rating": ("id", {
+        "film_id": "dim_film(film_id)",
+        "date_id": "dim_date(date_id)",
+    }),
+    "fact_showtime_fillrate": ("id", {
+        "date_id": "dim_date(date_id)",
+        "film_id": "dim_film(film_id)",
+        "showtime_id": "dim_showtime(showtime_id)",
+    }),
+    "fact_promotion_analysis": ("id", {
+        "date_id": "dim_date(date_id)",
+    }),
+}
+FUTURE_MONTHS = 3
+NULL_DATE_SUFFIX = "_null_date"
+
+
+def _add_months(d, months):
+    year, month = divmod(d.month - 1 + months, 12)
+    return date(d.year + year, month + 1, 1)
+
+
+def _swap_serial_owner(table, old_table, key):
+    # Sequence của cột serial thuộc bảng cũ; chuyển sang bảng mới trước khi DROP bảng cũ
+    op.execute(
+        f"DO $$ DECLARE seq text := pg_get_serial_sequence('{old_table}', '{key}'); BEGIN"
+        f" IF seq IS NOT NULL THEN EXECUTE format('ALTER SEQUENCE %s OWNED BY {table}.{key}', seq); END IF; END $$"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    this_month = date.today().replace(day=1)
+
+    for table, (key, foreign_keys) in FACT_TABLES.items():
+        old_table = f"{table}_old"
+        op.execute(f"ALTER TABLE {table} RENAME TO {old_table}")
+        op.execute(f"ALTER TABLE {old_table} RENAME CONSTRAINT {table}_pkey TO {old_table}_pkey")
+
+        op.execute(f"CREATE TABLE {table} (LIKE {old_table} INCLUDING DEFAULTS) PARTITION BY RANGE (date_id)")
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN date_id SET NOT NULL")
+        op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY ({key}, date_id)")
+        for column, reference in foreign_keys.items():
+            op.execute(f"ALTER TABLE {table} ADD FOREIGN KEY ({column}) REFERENCES {reference}")
+
+        months = set(conn.execute(sa.text(
+            f"SELECT DISTINCT date_trunc('month', date_id)::date FROM {old_table} WHERE date_id IS NOT NULL"
+        )).scalars())
+        months.update(_add_months(this_month, i) for i in range(FUTURE_MONTHS + 1))
+        for month in sorted(months):
+            upper = _add_months(month, 1)
+            op.execute(
+                f"CREATE TABLE {table}_y{month.year}m{month.month:02d} PARTITION OF {table}"
+                f" FOR VALUES FROM ('{month}') TO ('{upper}')"
+            )
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+        op.execute(f"INSERT INTO {table} SELECT * FROM {old_table} WHERE date_id IS NOT NULL")
+        # Dòng không có date_id không thể partition: giữ lại ở bảng riêng, không xóa cùng bảng cũ
+        null_rows = conn.execute(sa.text(f"SELECT count(*) FROM {old_table} WHERE date_id IS NULL")).scalar()
+        if null_rows:
+            op.execute(f"CREATE TABLE {table}{NULL_DATE_SUFFIX} AS SELECT * FROM {old_table} WHERE date_id IS NULL")
+            logging.warning(f"{null_rows} dòng {table} không có date_id được giữ trong {table}{NULL_DATE_SUFFIX}")
+        _swap_serial_owner(table, old_table, key)
+        op.execute(f"DROP TABLE {old_table}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, (key, foreign_keys) in FACT_TABLES.items():
+        heap_table = f"{table}_heap"
+        op.execute(f"CREATE TABLE {heap_table} (LIKE {table} INCLUDING DEFAULTS)")
+        op.execute(f"INSERT INTO {heap_table} SELECT * FROM {table}")
+        _swap_serial_owner(heap_table, table, key)
+        op.execute(f"DROP TABLE {table} CASCADE")
+        op.execute(f"ALTER TABLE {heap_table} RENAME TO {table}")
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN date_id DROP NOT NULL")
+        # Trả lại các dòng không có date_id đã được giữ riêng khi upgrade
+        op.execute(
+            f"DO $$ BEGIN IF to_regclass('{table}{NULL_DATE_SUFFIX}') IS NOT NULL THEN"
+            f" INSERT INTO {table} SELECT * FROM {table}{NULL_DATE_SUFFIX}; DROP TABLE {table}{NULL_DATE_SUFFIX};"
+            " END IF; END $$"
+        )
+        op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY ({key})")
+        for column, reference in foreign_keys.items():
+            op.execute(f"ALTER TABLE {table} ADD FOREIGN KEY ({column}) REFERENCES {reference}")
@@ -0,0 +1,29 @@
+"""them user_id cho fact_revenue
+
+Revision ID: b6d3f0a84c21
+Revises: a2c6e9f17b38
+Create Date: 2026-10-19 18:54:07.381926
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6d3f0a84c21'
+down_revision: Union[str, None] = 'a2c6e9f17b38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # user_bills nằm ở DB nguồn: dòng cũ để NULL đến khi chạy lại ETL đầy đủ fact_revenue
+    op.add_column('fact_revenue', sa.Column('user_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('fact_revenue', 'user_id')
@@ -0,0 +1,74 @@
+"""them index cho fact va dim_date
+
+Revision ID: c7a95e3b1f24
+Revises: b41d7e2f9c10
+Create Date: 2026-10-19 13:41:52.330871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7a95e3b1f24'
+down_revision: Union[str, None] = 'b41d7e2f9c10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_dim_date_year_month', 'dim_date', ['year', 'month', 'date_id'], unique=False)
+
+    op.create_index('ix_fact_revenue_date_id_brin', 'fact_revenue', ['date_id'], unique=False, postgresql_using='brin')
+    op.create_index('ix_fact_revenue_film_id', 'fact_revenue', ['film_id'], unique=False)
+    op.create_index('ix_fact_revenue_cinema_id', 'fact_revenue', ['cinema_id'], unique=False)
+    op.create_index('ix_fact_revenue_payment_method_id', 'fact_revenue', ['payment_method_id'], unique=False)
+    op.create_index('ix_fact_revenue_date_payment_cov', 'fact_revenue', ['date_id', 'payment_method_id'], unique=False, postgresql_include=['value'])
+    op.create_index('ix_fact_revenue_date_cinema_cov', 'fact_revenue', ['date_id', 'cinema_id'], unique=False, postgresql_include=['value'])
+    op.create_index('ix_fact_revenue_date_film_cov', 'fact_revenue', ['date_id', 'film_id'], unique=False, postgresql_include=['value'])
+
+    op.create_index('ix_fact_ticket_analysis_date_id_brin', 'fact_ticket_analysis', ['date_id'], unique=False, postgresql_using='brin')
+    op.create_index('ix_fact_ticket_analysis_bill_id', 'fact_ticket_analysis', ['bill_id'], unique=False)
+    op.create_index('ix_fact_ticket_analysis_payment_method_id', 'fact_ticket_analysis', ['payment_method_id'], unique=False)
+
+    op.create_index('ix_fact_film_rating_date_id_brin', 'fact_film_rating', ['date_id'], unique=False, postgresql_using='brin')
+    op.create_index('ix_fact_film_rating_film_cov', 'fact_film_rating', ['film_id'], unique=False, postgresql_include=['point'])
+
+    op.create_index('ix_fact_showtime_fillrate_date_id_brin', 'fact_showtime_fillrate', ['date_id'], unique=False, postgresql_using='brin')
+    op.create_index('ix_fact_showtime_fillrate_showtime_id', 'fact_showtime_fillrate', ['showtime_id'], unique=False)
+    op.create_index('ix_fact_showtime_fillrate_date_film_cov', 'fact_showtime_fillrate', ['date_id', 'film_id'], unique=False, postgresql_include=['fill_rate'])
+
+    op.create_index('ix_fact_promotion_analysis_date_id_brin', 'fact_promotion_analysis', ['date_id'], unique=False, postgresql_using='brin')
+    op.create_index('ix_fact_promotion_analysis_bill_id', 'fact_promotion_analysis', ['bill_id'], unique=False)
+    op.create_index('ix_fact_promotion_analysis_date_cov', 'fact_promotion_analysis', ['date_id'], unique=False, postgresql_include=['promotion_used'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_fact_promotion_analysis_date_cov', table_name='fact_promotion_analysis')
+    op.drop_index('ix_fact_promotion_analysis_bill_id', table_name='fact_promotion_analysis')
+    op.drop_index('ix_fact_promotion_analysis_date_id_brin', table_name='fact_promotion_analysis')
+
+    op.drop_index('ix_fact_showtime_fillrate_date_film_cov', table_name='fact_showtime_fillrate')
+    op.drop_index('ix_fact_showtime_fillrate_showtime_id', table_name='fact_showtime_fillrate')
+    op.drop_index('ix_fact_showtime_fillrate_date_id_brin', table_name='fact_showtime_fillrate')
+
+    op.drop_index('ix_fact_film_rating_film_cov', table_name='fact_film_rating')
+    op.drop_index('ix_fact_film_rating_date_id_brin', table_name='fact_film_rating')
+
+    op.drop_index('ix_fact_ticket_analysis_payment_method_id', table_name='fact_ticket_analysis')
+    op.drop_index('ix_fact_ticket_analysis_bill_id', table_name='fact_ticket_analysis')
+    op.drop_index('ix_fact_ticket_analysis_date_id_brin', table_name='fact_ticket_analysis')
+
+    op.drop_index('ix_fact_revenue_date_film_cov', table_name='fact_revenue')
+    op.drop_index('ix_fact_revenue_date_cinema_cov', table_name='fact_revenue')
+    op.drop_index('ix_fact_revenue_date_payment_cov', table_name='fact_revenue')
+    op.drop_index('ix_fact_revenue_payment_method_id', table_name='fact_revenue')
+    op.drop_index('ix_fact_revenue_cinema_id', table_name='fact_revenue')
+    op.drop_index('ix_fact_revenue_film_id', table_name='fact_revenue')
+    op.drop_index('ix_fact_revenue_date_id_brin', table_name='fact_revenue')
+
+    op.drop_index('ix_dim_date_year_month', table_name='dim_date')
@@ -0,0 +1,40 @@
+"""them histogram diem cho agg_daily_rating
+
+Revision ID: c9e4a7b15d62
+Revises: b6d3f0a84c21
+Create Date: 2026-10-19 19:31:42.605817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9e4a7b15d62'
+down_revision: Union[str, None] = 'b6d3f0a84c21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+POINTS = range(1, 6)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for point in POINTS:
+        op.add_column('agg_daily_rating', sa.Column(f'rating_{point}', sa.Integer(), nullable=False, server_default='0'))
+
+    # Điền histogram cho các dòng rollup đã có từ fact_film_rating
+    counts = ", ".join(f"count(*) FILTER (WHERE point = {point}) AS rating_{point}" for point in POINTS)
+    op.execute(
+        f"UPDATE agg_daily_rating a SET {', '.join(f'rating_{point} = h.rating_{point}' for point in POINTS)}"
+        f" FROM (SELECT date_id, coalesce(film_id, 0) AS film_id, {counts} FROM fact_film_rating GROUP BY 1, 2) h"
+        " WHERE a.date_id = h.date_id AND a.film_id = h.film_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for point in POINTS:
+        op.drop_column('agg_daily_rating', f'rating_{point}')
@@ -0,0 +1,34 @@
+"""them bang etl_dirty_month
+
+Revision ID: d3f08a6c2e57
+Revises: c7a95e3b1f24
+Create Date: 2026-10-19 15:02:11.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f08a6c2e57'
+down_revision: Union[str, None] = 'c7a95e3b1f24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('etl_dirty_month',
+    sa.Column('table_name', sa.String(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('marked_at', sa.DateTime(timezone=True), server_default=sa.text('clock_timestamp()'), nullable=False),
+    sa.PrimaryKeyConstraint('table_name', 'year', 'month')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('etl_dirty_month')
@@ -0,0 +1,28 @@
+"""them last_loaded_id vao etl_metadata
+
+Revision ID: d71b4c9e2a58
+Revises: c9e4a7b15d62
+Create Date: 2026-10-19 21:04:17.392851
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd71b4c9e2a58'
+down_revision: Union[str, None] = 'c9e4a7b15d62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('etl_metadata', sa.Column('last_loaded_id', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('etl_metadata', 'last_loaded_id')
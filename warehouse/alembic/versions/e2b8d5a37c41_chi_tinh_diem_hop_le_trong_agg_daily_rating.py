@@ -0,0 +1,49 @@
+"""chi tinh diem hop le trong agg_daily_rating
+
+Revision ID: e2b8d5a37c41
+Revises: d71b4c9e2a58
+Create Date: 2026-10-19 23:12:08.514270
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b8d5a37c41'
+down_revision: Union[str, None] = 'd71b4c9e2a58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+VALID_POINT = "point BETWEEN 1 AND 5"
+
+
+def _recompute(point_filter):
+    op.execute(
+        "UPDATE agg_daily_rating a SET rating_count = h.rating_count, rating_sum = h.rating_sum"
+        f" FROM (SELECT date_id, coalesce(film_id, 0) AS film_id,"
+        f" count(*) FILTER (WHERE {point_filter}) AS rating_count,"
+        f" coalesce(sum(point) FILTER (WHERE {point_filter}), 0) AS rating_sum"
+        " FROM fact_film_rating GROUP BY 1, 2) h"
+        " WHERE a.date_id = h.date_id AND a.film_id = h.film_id"
+        " AND (a.rating_count, a.rating_sum) IS DISTINCT FROM (h.rating_count, h.rating_sum)"
+    )
+    # Các tháng có điểm ngoài 1-5: đánh dấu bẩn để mart điểm phim được tính lại ở lần refresh sau
+    op.execute(
+        "INSERT INTO etl_dirty_month (table_name, year, month, marked_at)"
+        " SELECT DISTINCT 'fact_film_rating', extract(year FROM date_id)::int, extract(month FROM date_id)::int, clock_timestamp()"
+        f" FROM fact_film_rating WHERE NOT ({VALID_POINT}) OR point IS NULL"
+        " ON CONFLICT (table_name, year, month) DO UPDATE SET marked_at = EXCLUDED.marked_at"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _recompute(VALID_POINT)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _recompute("TRUE")
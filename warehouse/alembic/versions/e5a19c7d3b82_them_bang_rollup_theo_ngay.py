@@ -0,0 +1,77 @@
+"""them bang rollup theo ngay
+
+Revision ID: e5a19c7d3b82
+Revises: d3f08a6c2e57
+Create Date: 2026-10-19 16:20:45.918302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a19c7d3b82'
+down_revision: Union[str, None] = 'd3f08a6c2e57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('agg_daily_revenue',
+    sa.Column('date_id', sa.Date(), nullable=False),
+    sa.Column('cinema_id', sa.Integer(), nullable=False),
+    sa.Column('film_id', sa.Integer(), nullable=False),
+    sa.Column('payment_method_id', sa.Integer(), nullable=False),
+    sa.Column('purchase_type_id', sa.Integer(), nullable=False),
+    sa.Column('bill_count', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('date_id', 'cinema_id', 'film_id', 'payment_method_id', 'purchase_type_id')
+    )
+    op.create_table('agg_daily_ticket',
+    sa.Column('date_id', sa.Date(), nullable=False),
+    sa.Column('payment_method_id', sa.Integer(), nullable=False),
+    sa.Column('purchase_type_id', sa.Integer(), nullable=False),
+    sa.Column('ticket_count', sa.Integer(), nullable=False),
+    sa.Column('ticket_revenue', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('date_id', 'payment_method_id', 'purchase_type_id')
+    )
+    op.create_table('agg_daily_promotion',
+    sa.Column('date_id', sa.Date(), nullable=False),
+    sa.Column('used_count', sa.Integer(), nullable=False),
+    sa.Column('not_used_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('date_id')
+    )
+    op.create_table('agg_daily_rating',
+    sa.Column('date_id', sa.Date(), nullable=False),
+    sa.Column('film_id', sa.Integer(), nullable=False),
+    sa.Column('rating_count', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('date_id', 'film_id')
+    )
+
+    # Nạp lần đầu từ dữ liệu fact hiện có
+    for rollup_table, sql in (
+        ('agg_daily_revenue',
+         "SELECT date_id, coalesce(cinema_id, 0), coalesce(film_id, 0), coalesce(payment_method_id, 0), coalesce(purchase_type_id, 0),"
+         " count(*), coalesce(sum(value), 0) FROM fact_revenue GROUP BY 1, 2, 3, 4, 5"),
+        ('agg_daily_ticket',
+         "SELECT date_id, coalesce(payment_method_id, 0), coalesce(purchase_type_id, 0), count(*), coalesce(sum(price), 0)"
+         " FROM fact_ticket_analysis GROUP BY 1, 2, 3"),
+        ('agg_daily_promotion',
+         "SELECT date_id, count(*) FILTER (WHERE promotion_used), count(*) FILTER (WHERE NOT promotion_used)"
+         " FROM fact_promotion_analysis GROUP BY 1"),
+        ('agg_daily_rating',
+         "SELECT date_id, coalesce(film_id, 0), count(*), coalesce(sum(point), 0) FROM fact_film_rating GROUP BY 1, 2"),
+    ):
+        op.execute(f"INSERT INTO {rollup_table} {sql}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('agg_daily_rating')
+    op.drop_table('agg_daily_promotion')
+    op.drop_table('agg_daily_ticket')
+    op.drop_table('agg_daily_revenue')
@@ -0,0 +1,59 @@
+"""them materialized view cho mart
+
+Revision ID: f8b27d4e6a13
+Revises: e5a19c7d3b82
+Create Date: 2026-10-19 17:05:33.671240
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f8b27d4e6a13'
+down_revision: Union[str, None] = 'e5a19c7d3b82'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Bản chụp định nghĩa trong warehouse/matviews.py tại thời điểm migration
+MATERIALIZED_VIEWS = {
+    "mv_monthly_revenue": {
+        "sql": """
+            SELECT extract(year FROM date_id)::int AS year, extract(month FROM date_id)::int AS month,
+                   cinema_id, film_id, payment_method_id, purchase_type_id,
+                   sum(bill_count)::int AS bill_count, sum(revenue)::bigint AS revenue
+            FROM agg_daily_revenue
+            GROUP BY 1, 2, cinema_id, film_id, payment_method_id, purchase_type_id
+        """,
+        "unique": ["year", "month", "cinema_id", "film_id", "payment_method_id", "purchase_type_id"],
+    },
+}
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('mv_refresh_log',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('view_name', sa.String(), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('duration_ms', sa.Integer(), nullable=False),
+    sa.Column('concurrent', sa.Boolean(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_mv_refresh_log_view_name'), 'mv_refresh_log', ['view_name'], unique=False)
+
+    for name, view in MATERIALIZED_VIEWS.items():
+        op.execute(f"CREATE MATERIALIZED VIEW {name} AS {view['sql']}")
+        op.execute(f"CREATE UNIQUE INDEX ux_{name} ON {name} ({', '.join(view['unique'])})")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in reversed(list(MATERIALIZED_VIEWS)):
+        op.execute(f"DROP MATERIALIZED VIEW IF EXISTS {name}")
+    op.drop_index(op.f('ix_mv_refresh_log_view_name'), table_name='mv_refresh_log')
+    op.drop_table('mv_refresh_log')
@@ -1,11 +1,18 @@
 import logging
-from sqlalchemy.orm import sessionmaker, joinedload, selectinload
+from sqlalchemy.orm import sessionmaker, joinedload, selectinload, contains_eager
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import SQLAlchemyError
-from datetime import datetime
-from warehouse.etl_metadata.utils.etl_metadata import get_last_loaded_time, update_last_loaded_time
+from datetime import datetime, timedelta
+from warehouse.etl_metadata.utils.etl_metadata import (
+    get_last_loaded_time, update_last_loaded_time, get_last_loaded_id, update_last_loaded_id,
+    mark_dirty_months, mark_all_months_dirty,
+)
+from warehouse.adaptive_batch import AdaptiveBatchSizer, DEFAULT_BATCH_SIZE
+from warehouse.rollup import apply_rollup_delta, fetch_fact_rows, rebuild_rollup
 
 
-BATCH_SIZE = 1000 # Có thể điều chỉnh
+BATCH_SIZE = DEFAULT_BATCH_SIZE # Kích thước cố định cho các loader full; loader incremental tự điều chỉnh
 
 # --- Hàm trợ giúp ---
 def get_time_id(dt: datetime):
@@ -17,6 +24,16 @@ def get_purchase_type_id(staff_id):
     # Trả về 1 nếu mua tại quầy (có staff_id), 2 nếu mua online (staff_id là None)
     return 1 if staff_id is not None else 2
 
+def get_bill_user_id(bill):
+    # Bill gắn với khách hàng qua user_bills; lấy dòng đầu tiên nếu có
+    return bill.user_bill[0].user_id if bill.user_bill else None
+
+def as_watermark(dt: datetime):
+    # Cột thời gian nguồn là timestamptz (datetime có múi giờ, theo TimeZone của session), còn
+    # etl_metadata.last_loaded_time là timestamp không múi giờ: bỏ tzinfo để so sánh được,
+    # Postgres cũng hiểu giá trị không múi giờ theo TimeZone của session khi lọc.
+    return dt.replace(tzinfo=None) if dt.tzinfo is not None else dt
+
 def map_payment_method_to_id(method_text: str):
     if method_text is None:
         return None
@@ -210,6 +227,8 @@ def etl_dim_promotion(session_src, session_dest, PromotionSrc, DimPromotion):
 def etl_fact_ticket_analysis(session_src, session_dest, TicketSrc, BillSrc, FactTicketAnalysis):
     try:
         logging.info("Bắt đầu: etl_fact_ticket_analysis")
+        # Nạp lại toàn bộ: xóa dữ liệu cũ trong cùng transaction để chạy lại không sinh dòng trùng
+        session_dest.execute(FactTicketAnalysis.__table__.delete())
         # Join Ticket và Bill để lấy thông tin cần thiết
         # Cần đảm bảo mối quan hệ giữa Ticket và Bill được định nghĩa đúng trong models
         # Giả sử Ticket có quan hệ trực tiếp hoặc gián tiếp tới Bill
@@ -231,6 +250,8 @@ def etl_fact_ticket_analysis(session_src, session_dest, TicketSrc, BillSrc, Fact
                 if bill.payment_method is None:
                      logging.warning(f"Bỏ qua Ticket ID {t.id}, Bill ID {bill.id}: payment_method is None.")
                      continue # Hoặc gán giá trị mặc định nếu có thể
+                if bill.status in BillSrc.CLOSED_STATUSES:
+                    continue
 
                 payment_method_id = map_payment_method_to_id(bill.payment_method)
                 if payment_method_id is None:
@@ -254,6 +275,9 @@ def etl_fact_ticket_analysis(session_src, session_dest, TicketSrc, BillSrc, Fact
             except Exception as item_error:
                 logging.error(f"Lỗi khi xử lý ticket ID {t.id}: {item_error}")
 
+        session_dest.flush()
+        mark_all_months_dirty(session_dest, "fact_ticket_analysis")
+        rebuild_rollup(session_dest, "fact_ticket_analysis")
         session_dest.commit()
         logging.info(f"Hoàn thành: etl_fact_ticket_analysis - Đã xử lý {count} bản ghi.")
     except SQLAlchemyError as db_error:
@@ -283,6 +307,8 @@ def etl_fact_film_rating_optimized(session_src: sessionmaker,
     """
     try:
         logging.info("Bắt đầu: etl_fact_film_rating_optimized")
+        # Nạp lại toàn bộ: xóa dữ liệu cũ trong cùng transaction để chạy lại không sinh dòng trùng
+        session_dest.execute(FactFilmRating.__table__.delete())
 
         # --- (TÙY CHỌN) Bước kiểm tra khóa ngoại chủ động ---
         valid_user_ids = set()
@@ -392,6 +418,9 @@ def etl_fact_film_rating_optimized(session_src: sessionmaker,
 
         # Commit cuối cùng
         logging.info(f"Hoàn tất duyệt qua các bản ghi đánh giá. Chuẩn bị commit {count} bản ghi hợp lệ...")
+        session_dest.flush()
+        mark_all_months_dirty(session_dest, "fact_film_rating")
+        rebuild_rollup(session_dest, "fact_film_rating")
         session_dest.commit()
         logging.info(f"Hoàn thành: etl_fact_film_rating_optimized - Đã xử lý {count} bản ghi. Bỏ qua {skipped_count} bản ghi.")
 
@@ -424,11 +453,14 @@ def etl_fact_revenue_optimized_v4(session_src: sessionmaker,
     """
     try:
         logging.info("Bắt đầu: etl_fact_revenue_optimized_v4 (Query từ Ticket, Room trong Showtime)")
+        # Nạp lại toàn bộ: xóa dữ liệu cũ trong cùng transaction để chạy lại không sinh dòng trùng
+        session_dest.execute(FactRevenue.__table__.delete())
 
         # Truy vấn từ TicketSrc và joinedload các quan hệ cần thiết
         # Đã sửa lại đường dẫn joinedload cho Room (nằm trong Showtime)
         query = session_src.query(TicketSrc).options(
-            joinedload(TicketSrc.bill), # Tải Bill từ Ticket
+            joinedload(TicketSrc.bill) # Tải Bill từ Ticket
+                .selectinload(BillSrc.user_bill), # user_bills của Bill (collection: selectinload, hợp với yield_per)
             joinedload(TicketSrc.showtime_seat) # Tải ShowtimeSeat từ Ticket
                 .joinedload(ShowtimeSeatSrc.showtime) # Tải Showtime từ ShowtimeSeat
                 .joinedload(ShowtimeSrc.room) # Tải Room từ Showtime (ĐÃ SỬA)
@@ -479,6 +511,8 @@ def etl_fact_revenue_optimized_v4(session_src: sessionmaker,
                 if bill.payment_method is None:
                     logging.warning(f"Bỏ qua Ticket ID {t.id}, Bill ID {bill.id}: payment_method is None.")
                     continue
+                if bill.status in BillSrc.CLOSED_STATUSES:
+                    continue
                 # --- Kết thúc kiểm tra ---
 
                 # --- Ánh xạ và tạo Fact ---
@@ -493,6 +527,7 @@ def etl_fact_revenue_optimized_v4(session_src: sessionmaker,
                     time_id=get_time_id(bill.payment_time),
                     film_id=showtime.film_id, # Lấy từ showtime
                     cinema_id=room.cinema_id, # Lấy từ room
+                    user_id=get_bill_user_id(bill),
                     value=bill.value,
                     payment_method_id=payment_method_id,
                     purchase_type_id=get_purchase_type_id(bill.staff_id)
@@ -515,6 +550,9 @@ def etl_fact_revenue_optimized_v4(session_src: sessionmaker,
 
         # Commit cuối cùng
         logging.info("Hoàn tất duyệt qua các ticket, chuẩn bị commit...")
+        session_dest.flush()
+        mark_all_months_dirty(session_dest, "fact_revenue")
+        rebuild_rollup(session_dest, "fact_revenue")
         session_dest.commit()
         logging.info(f"Hoàn thành: etl_fact_revenue_optimized_v4 - Đã xử lý và commit {count} bản ghi.")
 
@@ -541,10 +579,13 @@ def etl_fact_showtime_fillrate_optimized_v2(session_src: sessionmaker,
     """
     try:
         logging.info("Bắt đầu: etl_fact_showtime_fillrate_optimized_v2 (dùng selectinload)")
+        # Nạp lại toàn bộ: xóa dữ liệu cũ trong cùng transaction để chạy lại không sinh dòng trùng
+        session_dest.execute(FactShowtimeFillRate.__table__.delete())
 
         # Sử dụng selectinload cho collection 'showtime_seat'
         # và giữ joinedload cho 'ticket' (nếu là many-to-one/one-to-one)
         query = session_src.query(ShowtimeSrc).options(
+            joinedload(ShowtimeSrc.room),  # lấy cinema_id của suất chiếu
             # THAY THẾ joinedload ở đây bằng selectinload
             selectinload(ShowtimeSrc.showtime_seat)
                 # Có thể giữ joinedload lồng nhau nếu ticket là quan hệ *-to-one
@@ -579,6 +620,7 @@ def etl_fact_showtime_fillrate_optimized_v2(session_src: sessionmaker,
                 fact = FactShowtimeFillRate(
                     date_id=s.start_time.date(),
                     film_id=s.film_id,
+                    cinema_id=s.room.cinema_id if s.room else None,
                     showtime_id=s.id,
                     total_seats=total,
                     booked_seats=booked,
@@ -597,6 +639,8 @@ def etl_fact_showtime_fillrate_optimized_v2(session_src: sessionmaker,
         # --- Hết phần logic trong vòng lặp ---
 
         logging.info("Hoàn tất duyệt qua các showtime, chuẩn bị commit...")
+        session_dest.flush()
+        mark_all_months_dirty(session_dest, "fact_showtime_fillrate")
         session_dest.commit()
         logging.info(f"Hoàn thành: etl_fact_showtime_fillrate_optimized_v2 - Đã xử lý và commit {count} bản ghi.")
 
@@ -624,6 +668,8 @@ def etl_fact_promotion_analysis_optimized(session_src: sessionmaker,
     """
     try:
         logging.info("Bắt đầu: etl_fact_promotion_analysis_optimized")
+        # Nạp lại toàn bộ: xóa dữ liệu cũ trong cùng transaction để chạy lại không sinh dòng trùng
+        session_dest.execute(FactPromotionAnalysis.__table__.delete())
 
         # 1. Truy vấn trước tất cả các bill_id đã sử dụng khuyến mãi (từ BillPromSrc)
         #    Sử dụng distinct() để tránh trùng lặp và lấy chỉ cột bill_id.
@@ -651,6 +697,8 @@ def etl_fact_promotion_analysis_optimized(session_src: sessionmaker,
                 if b.payment_time is None:
                     logging.warning(f"Bỏ qua Bill ID {b.id}: payment_time is None.")
                     continue
+                if b.status in BillSrc.CLOSED_STATUSES:
+                    continue
 
                 # 3. Kiểm tra xem bill_id có trong tập hợp đã lấy trước không (O(1) lookup)
                 #    Loại bỏ hoàn toàn truy vấn exists() bên trong vòng lặp.
@@ -680,6 +728,9 @@ def etl_fact_promotion_analysis_optimized(session_src: sessionmaker,
 
         # Commit cuối cùng
         logging.info("Hoàn tất duyệt qua các hóa đơn, chuẩn bị commit...")
+        session_dest.flush()
+        mark_all_months_dirty(session_dest, "fact_promotion_analysis")
+        rebuild_rollup(session_dest, "fact_promotion_analysis")
         session_dest.commit()
         logging.info(f"Hoàn thành: etl_fact_promotion_analysis_optimized - Đã xử lý và commit {count} bản ghi.")
 
@@ -694,6 +745,60 @@ def etl_fact_promotion_analysis_optimized(session_src: sessionmaker,
 
 
 # --- Incremental ETL Functions ---
+# Mỗi loader incremental dùng AdaptiveBatchSizer: kích thước batch được điều chỉnh
+# theo thời gian fetch/transform/write và RSS, rồi lưu lại vào etl_metadata.
+# Mỗi batch là một truy vấn LIMIT riêng và được ghi bằng một lệnh INSERT executemany.
+def write_facts(session, table, facts):
+    """Insert `facts` (fact objects that are not added to the session) into `table` in one executemany."""
+    # Cột id tự tăng và cột có giá trị mặc định ở server do database điền
+    columns = [c for c in table.columns if c.autoincrement is not True and c.server_default is None]
+    rows = [{c.name: getattr(fact, c.key) for c in columns} for fact in facts]
+    if rows:
+        session.execute(insert(table), rows)
+    return len(rows)
+
+def replace_facts(session, table, key, facts):
+    """
+    Write `facts` keeping one row per business key `key` (bill_id, ticket_id,
+    showtime_id). date_id is part of the primary key, so a source row whose
+    date moved would otherwise leave its old row in the previous month: rows
+    with the same key are deleted first, whatever their date_id. Returns the
+    deleted rows, for rollup deltas and dirty months.
+    """
+    column = table.c[key]
+    keys = {getattr(fact, key) for fact in facts}
+    replaced = fetch_fact_rows(session, table, [(column, keys)])
+    for chunk in _chunks(keys):
+        session.execute(table.delete().where(column.in_(chunk)))
+    write_facts(session, table, facts)
+    return replaced
+
+def ticket_analysis_fact(t, Bill, FactTicketAnalysis):
+    """Ticket fact for ticket `t` (with `t.bill` loaded), or None when the ticket is not counted."""
+    bill = t.bill
+    created_at = t.created_at
+
+    if bill is None or bill.payment_method is None:
+        logging.warning(f"Bỏ qua Ticket ID {t.id}: Bill liên kết không hợp lệ.")
+        return None
+    if bill.status in Bill.CLOSED_STATUSES:
+        return None
+
+    payment_method_id = map_payment_method_to_id(bill.payment_method)
+    if payment_method_id is None:
+        logging.warning(f"Bỏ qua Ticket ID {t.id}: Không thể map payment_method '{bill.payment_method}'.")
+        return None
+
+    return FactTicketAnalysis(
+        ticket_id=t.id,
+        bill_id=bill.id,
+        price=t.price,
+        date_id=created_at.date(),
+        time_id=get_time_id(created_at),
+        payment_method_id=payment_method_id,
+        purchase_type_id=get_purchase_type_id(bill.staff_id)
+    )
+
 def etl_fact_ticket_analysis_incremental(session_src, session_dest, Ticket, Bill, FactTicketAnalysis):
     """
     Incremental ETL for the ticket analysis fact table.
@@ -701,49 +806,41 @@ def etl_fact_ticket_analysis_incremental(session_src, session_dest, Ticket, Bill
     """
     last_time = get_last_loaded_time(session_dest, "fact_ticket_analysis")
     logging.info(f"Bắt đầu: etl_fact_ticket_analysis_incremental (từ {last_time})")
+    sizer = AdaptiveBatchSizer.from_metadata(session_dest, "fact_ticket_analysis")
 
     tickets = (
         session_src.query(Ticket)
         .join(Bill)
+        .options(contains_eager(Ticket.bill))
         .filter(Ticket.created_at > last_time)
-        .all()
     )
 
     max_time = last_time
     count = 0
-    for t in tickets:
-        try:
-            bill = t.bill
-            created_at = t.created_at
-            
-            if bill is None or bill.payment_method is None:
-                logging.warning(f"Bỏ qua Ticket ID {t.id}: Bill liên kết không hợp lệ.")
-                continue
-                
-            payment_method_id = map_payment_method_to_id(bill.payment_method)
-            if payment_method_id is None:
-                logging.warning(f"Bỏ qua Ticket ID {t.id}: Không thể map payment_method '{bill.payment_method}'.")
-                continue
-                
-            fact = FactTicketAnalysis(
-                ticket_id=t.id,
-                bill_id=bill.id,
-                price=t.price,
-                date_id=created_at.date(),
-                time_id=get_time_id(created_at),
-                payment_method_id=payment_method_id,
-                purchase_type_id=get_purchase_type_id(bill.staff_id)
-            )
-            session_dest.merge(fact)
-            count += 1
-            
-            if created_at > max_time:
-                max_time = created_at
-        except Exception as item_error:
-            logging.error(f"Lỗi khi xử lý ticket ID {t.id}: {item_error}")
+    for batch in sizer.batches(tickets, [Ticket.created_at, Ticket.id]):
+        facts = []
+        with sizer.timed("transform"):
+            for t in batch:
+                try:
+                    fact = ticket_analysis_fact(t, Bill, FactTicketAnalysis)
+                    if fact is None:
+                        continue
+                    facts.append(fact)
+
+                    max_time = max(max_time, as_watermark(t.created_at))
+                except Exception as item_error:
+                    logging.error(f"Lỗi khi xử lý ticket ID {t.id}: {item_error}")
+
+        with sizer.timed("write"):
+            # Dòng fact cũ của cùng ticket (nếu có) bị thay -> trừ khỏi rollup, tháng cũ cũng phải tính lại
+            replaced = replace_facts(session_dest, FactTicketAnalysis.__table__, "ticket_id", facts)
+            mark_dirty_months(session_dest, "fact_ticket_analysis", [row.date_id for row in replaced + facts])
+            apply_rollup_delta(session_dest, "fact_ticket_analysis", replaced, facts)
+        count += len(facts)
 
     session_dest.commit()
     update_last_loaded_time(session_dest, "fact_ticket_analysis", max_time)
+    sizer.save(session_dest)
     logging.info(f"Hoàn thành: etl_fact_ticket_analysis_incremental - Đã xử lý {count} bản ghi mới.")
 
 def etl_fact_film_rating_incremental(session_src, session_dest, RateSrc, FactFilmRating):
@@ -753,48 +850,120 @@ def etl_fact_film_rating_incremental(session_src, session_dest, RateSrc, FactFil
     """
     last_time = get_last_loaded_time(session_dest, "fact_film_rating")
     logging.info(f"Bắt đầu: etl_fact_film_rating_incremental (từ {last_time})")
-    
+    sizer = AdaptiveBatchSizer.from_metadata(session_dest, "fact_film_rating")
+
     rates = (
         session_src.query(RateSrc)
         .filter(RateSrc.created_at > last_time)
-        .yield_per(BATCH_SIZE)
     )
-    
+
     max_time = last_time
     count = 0
     skipped_count = 0
-    
-    for r in rates:
-        try:
-            # Kiểm tra các giá trị bắt buộc
-            if r.user_id is None or r.film_id is None or r.created_at is None or r.point is None:
-                logging.warning(f"Bỏ qua rate ID {r.id or 'UNKNOWN'} do thiếu thông tin bắt buộc.")
-                skipped_count += 1
-                continue
-            
-            # Tạo đối tượng Fact
-            rating_date = r.created_at.date()
-            fact = FactFilmRating(
-                user_id=r.user_id,
-                film_id=r.film_id,
-                date_id=rating_date,
-                point=r.point,
-                detail=r.detail
-            )
-            session_dest.merge(fact)
-            count += 1
-            
-            if r.created_at > max_time:
-                max_time = r.created_at
-                
-        except Exception as item_error:
-            logging.error(f"Lỗi khi xử lý rate ID {r.id or 'UNKNOWN'}: {item_error}")
-            skipped_count += 1
-    
+
+    for batch in sizer.batches(rates, [RateSrc.created_at, RateSrc.id]):
+        facts = []
+        with sizer.timed("transform"):
+            for r in batch:
+                try:
+                    # Kiểm tra các giá trị bắt buộc
+                    if r.user_id is None or r.film_id is None or r.created_at is None or r.point is None:
+                        logging.warning(f"Bỏ qua rate ID {r.id or 'UNKNOWN'} do thiếu thông tin bắt buộc.")
+                        skipped_count += 1
+                        continue
+
+                    # Tạo đối tượng Fact
+                    facts.append(FactFilmRating(
+                        user_id=r.user_id,
+                        film_id=r.film_id,
+                        date_id=r.created_at.date(),
+                        point=r.point,
+                        detail=r.detail
+                    ))
+
+                    max_time = max(max_time, as_watermark(r.created_at))
+
+                except Exception as item_error:
+                    logging.error(f"Lỗi khi xử lý rate ID {r.id or 'UNKNOWN'}: {item_error}")
+                    skipped_count += 1
+
+        with sizer.timed("write"):
+            write_facts(session_dest, FactFilmRating.__table__, facts)
+            mark_dirty_months(session_dest, "fact_film_rating", [fact.date_id for fact in facts])
+            apply_rollup_delta(session_dest, "fact_film_rating", [], facts)  # id tự tăng: luôn là dòng mới
+        count += len(facts)
+
     session_dest.commit()
     update_last_loaded_time(session_dest, "fact_film_rating", max_time)
+    sizer.save(session_dest)
     logging.info(f"Hoàn thành: etl_fact_film_rating_incremental - Đã xử lý {count} bản ghi mới. Bỏ qua {skipped_count} bản ghi.")
 
+def revenue_fact(session_src, bill, BillSrc, TicketSrc, ShowtimeSeatSrc, ShowtimeSrc, RoomSrc, FactRevenue):
+    """Revenue fact for `bill` (film and cinema from its first ticket), or None when the bill is not counted."""
+    # Kiểm tra giá trị bắt buộc của Bill
+    if bill.payment_time is None or bill.payment_method is None:
+        logging.warning(f"Bỏ qua Bill ID {bill.id}: thiếu thông tin payment_time hoặc payment_method.")
+        return None
+    # Bill đã hủy / hoàn tiền không tính doanh thu
+    if bill.status in BillSrc.CLOSED_STATUSES:
+        return None
+
+    # Lấy tất cả ticket liên quan đến bill này (theo id: ticket đầu tiên cố định, reconcile dựa vào đó)
+    tickets = session_src.query(TicketSrc).filter(TicketSrc.bill_id == bill.id).order_by(TicketSrc.id).all()
+    if not tickets or len(tickets) == 0:
+        logging.warning(f"Bỏ qua Bill ID {bill.id}: không tìm thấy ticket liên kết.")
+        return None
+
+    # Lấy thông tin film_id và cinema_id từ ticket đầu tiên
+    ticket = tickets[0]
+
+    # Lấy showtime_seat từ ticket
+    showtime_seat = session_src.query(ShowtimeSeatSrc).filter(ShowtimeSeatSrc.id == ticket.showtime_seat_id).first()
+    if not showtime_seat:
+        logging.warning(f"Bỏ qua Bill ID {bill.id}, Ticket ID {ticket.id}: không tìm thấy showtime_seat.")
+        return None
+
+    # Lấy showtime từ showtime_seat
+    showtime = session_src.query(ShowtimeSrc).filter(ShowtimeSrc.id == showtime_seat.showtime_id).first()
+    if not showtime:
+        logging.warning(f"Bỏ qua Bill ID {bill.id}, ShowtimeSeat ID {showtime_seat.id}: không tìm thấy showtime.")
+        return None
+
+    # Lấy film_id từ showtime
+    if not showtime.film_id:
+        logging.warning(f"Bỏ qua Bill ID {bill.id}, Showtime ID {showtime.id}: thiếu thông tin film_id.")
+        return None
+
+    # Lấy room từ showtime
+    room = session_src.query(RoomSrc).filter(RoomSrc.id == showtime.room_id).first()
+    if not room:
+        logging.warning(f"Bỏ qua Bill ID {bill.id}, Showtime ID {showtime.id}: không tìm thấy room.")
+        return None
+
+    # Lấy cinema_id từ room
+    if not room.cinema_id:
+        logging.warning(f"Bỏ qua Bill ID {bill.id}, Room ID {room.id}: thiếu thông tin cinema_id.")
+        return None
+
+    # Ánh xạ payment_method
+    payment_method_id = map_payment_method_to_id(bill.payment_method)
+    if payment_method_id is None:
+        logging.warning(f"Bỏ qua Bill ID {bill.id}: Không thể map payment_method '{bill.payment_method}'.")
+        return None
+
+    # Tạo fact
+    return FactRevenue(
+        bill_id=bill.id,
+        date_id=bill.payment_time.date(),
+        time_id=get_time_id(bill.payment_time),
+        film_id=showtime.film_id,
+        cinema_id=room.cinema_id,
+        user_id=get_bill_user_id(bill),
+        value=bill.value,
+        payment_method_id=payment_method_id,
+        purchase_type_id=get_purchase_type_id(bill.staff_id)
+    )
+
 def etl_fact_revenue_incremental(session_src, session_dest, BillSrc, TicketSrc, ShowtimeSeatSrc, ShowtimeSrc, RoomSrc, FactRevenue):
     """
     Incremental ETL for the revenue fact table.
@@ -802,89 +971,43 @@ def etl_fact_revenue_incremental(session_src, session_dest, BillSrc, TicketSrc,
     """
     last_time = get_last_loaded_time(session_dest, "fact_revenue")
     logging.info(f"Bắt đầu: etl_fact_revenue_incremental (từ {last_time})")
-    
+    sizer = AdaptiveBatchSizer.from_metadata(session_dest, "fact_revenue")
+
     # Truy vấn từ Bill để lấy các Bill mới
     query = (
         session_src.query(BillSrc)
         .filter(BillSrc.payment_time > last_time)
-        .yield_per(BATCH_SIZE)
+        .options(selectinload(BillSrc.user_bill))
     )
-    
+
     max_time = last_time
     count = 0
-    
-    for bill in query:
-        try:
-            # Kiểm tra giá trị bắt buộc của Bill
-            if bill.payment_time is None or bill.payment_method is None:
-                logging.warning(f"Bỏ qua Bill ID {bill.id}: thiếu thông tin payment_time hoặc payment_method.")
-                continue
-            
-            # Lấy tất cả ticket liên quan đến bill này
-            tickets = session_src.query(TicketSrc).filter(TicketSrc.bill_id == bill.id).all()
-            if not tickets or len(tickets) == 0:
-                logging.warning(f"Bỏ qua Bill ID {bill.id}: không tìm thấy ticket liên kết.")
-                continue
-            
-            # Lấy thông tin film_id và cinema_id từ ticket đầu tiên
-            ticket = tickets[0]
-            
-            # Lấy showtime_seat từ ticket
-            showtime_seat = session_src.query(ShowtimeSeatSrc).filter(ShowtimeSeatSrc.id == ticket.showtime_seat_id).first()
-            if not showtime_seat:
-                logging.warning(f"Bỏ qua Bill ID {bill.id}, Ticket ID {ticket.id}: không tìm thấy showtime_seat.")
-                continue
-            
-            # Lấy showtime từ showtime_seat
-            showtime = session_src.query(ShowtimeSrc).filter(ShowtimeSrc.id == showtime_seat.showtime_id).first()
-            if not showtime:
-                logging.warning(f"Bỏ qua Bill ID {bill.id}, ShowtimeSeat ID {showtime_seat.id}: không tìm thấy showtime.")
-                continue
-            
-            # Lấy film_id từ showtime
-            if not showtime.film_id:
-                logging.warning(f"Bỏ qua Bill ID {bill.id}, Showtime ID {showtime.id}: thiếu thông tin film_id.")
-                continue
-            
-            # Lấy room từ showtime
-            room = session_src.query(RoomSrc).filter(RoomSrc.id == showtime.room_id).first()
-            if not room:
-                logging.warning(f"Bỏ qua Bill ID {bill.id}, Showtime ID {showtime.id}: không tìm thấy room.")
-                continue
-            
-            # Lấy cinema_id từ room
-            if not room.cinema_id:
-                logging.warning(f"Bỏ qua Bill ID {bill.id}, Room ID {room.id}: thiếu thông tin cinema_id.")
-                continue
-            
-            # Ánh xạ payment_method
-            payment_method_id = map_payment_method_to_id(bill.payment_method)
-            if payment_method_id is None:
-                logging.warning(f"Bỏ qua Bill ID {bill.id}: Không thể map payment_method '{bill.payment_method}'.")
-                continue
-            
-            # Tạo fact
-            fact = FactRevenue(
-                bill_id=bill.id,
-                date_id=bill.payment_time.date(),
-                time_id=get_time_id(bill.payment_time),
-                film_id=showtime.film_id,
-                cinema_id=room.cinema_id,
-                value=bill.value,
-                payment_method_id=payment_method_id,
-                purchase_type_id=get_purchase_type_id(bill.staff_id)
-            )
-            session_dest.merge(fact)
-            count += 1
-            
-            if bill.payment_time > max_time:
-                max_time = bill.payment_time
-                
-        except Exception as item_error:
-            logging.error(f"Lỗi khi xử lý bill ID {bill.id}: {item_error}")
-    
+
+    for batch in sizer.batches(query, [BillSrc.payment_time, BillSrc.id]):
+        facts = []
+        with sizer.timed("transform"):
+            for bill in batch:
+                try:
+                    fact = revenue_fact(session_src, bill, BillSrc, TicketSrc, ShowtimeSeatSrc, ShowtimeSrc, RoomSrc, FactRevenue)
+                    if fact is None:
+                        continue
+                    facts.append(fact)
+
+                    max_time = max(max_time, as_watermark(bill.payment_time))
+
+                except Exception as item_error:
+                    logging.error(f"Lỗi khi xử lý bill ID {bill.id}: {item_error}")
+
+        with sizer.timed("write"):
+            # Dòng fact cũ của cùng bill (nếu có, kể cả khi payment_time đã đổi tháng) bị thay -> trừ khỏi rollup
+            replaced = replace_facts(session_dest, FactRevenue.__table__, "bill_id", facts)
+            mark_dirty_months(session_dest, "fact_revenue", [row.date_id for row in replaced + facts])
+            apply_rollup_delta(session_dest, "fact_revenue", replaced, facts)
+        count += len(facts)
+
     session_dest.commit()
     update_last_loaded_time(session_dest, "fact_revenue", max_time)
+    sizer.save(session_dest)
     logging.info(f"Hoàn thành: etl_fact_revenue_incremental - Đã xử lý {count} bản ghi mới.")
 
 def etl_fact_showtime_fillrate_incremental(session_src, session_dest, ShowtimeSrc, ShowtimeSeatSrc, FactShowtimeFillRate):
@@ -894,63 +1017,86 @@ def etl_fact_showtime_fillrate_incremental(session_src, session_dest, ShowtimeSr
     """
     last_time = get_last_loaded_time(session_dest, "fact_showtime_fillrate")
     logging.info(f"Bắt đầu: etl_fact_showtime_fillrate_incremental (từ {last_time})")
-    
+    sizer = AdaptiveBatchSizer.from_metadata(session_dest, "fact_showtime_fillrate")
+
     # Truy vấn các showtime mới
     query = (
         session_src.query(ShowtimeSrc)
         .filter(ShowtimeSrc.start_time > last_time)
         .options(
             selectinload(ShowtimeSrc.showtime_seat)
-            .joinedload(ShowtimeSeatSrc.ticket)
+            .joinedload(ShowtimeSeatSrc.ticket),
+            joinedload(ShowtimeSrc.room)
         )
-        .yield_per(BATCH_SIZE)
     )
-    
+
     max_time = last_time
     count = 0
-    
-    for s in query:
-        try:
-            if s.start_time is None or s.film_id is None:
-                logging.warning(f"Bỏ qua Showtime ID {s.id}: thiếu thông tin start_time hoặc film_id.")
-                continue
-            
-            # Truy cập thông tin ghế
-            showtime_seats = s.showtime_seat
-            total = len(showtime_seats)
-            
-            if total == 0:
-                logging.warning(f"Showtime ID {s.id} không có ghế nào (total=0), bỏ qua.")
-                continue
-            
-            # Tính tỷ lệ đặt ghế
-            booked = sum(1 for ss in showtime_seats if ss.ticket is not None)
-            fill_rate = booked / total
-            
-            # Tạo fact
-            fact = FactShowtimeFillRate(
-                date_id=s.start_time.date(),
-                film_id=s.film_id,
-                showtime_id=s.id,
-                total_seats=total,
-                booked_seats=booked,
-                fill_rate=fill_rate
-            )
-            session_dest.merge(fact)
-            count += 1
-            
-            if s.start_time > max_time:
-                max_time = s.start_time
-                
-        except ZeroDivisionError:
-            logging.error(f"Lỗi chia cho 0 khi xử lý showtime ID {s.id}")
-        except Exception as item_error:
-            logging.error(f"Lỗi khi xử lý showtime ID {s.id}: {item_error}")
-    
+
+    for batch in sizer.batches(query, [ShowtimeSrc.start_time, ShowtimeSrc.id]):
+        facts = []
+        with sizer.timed("transform"):
+            for s in batch:
+                try:
+                    if s.start_time is None or s.film_id is None:
+                        logging.warning(f"Bỏ qua Showtime ID {s.id}: thiếu thông tin start_time hoặc film_id.")
+                        continue
+
+                    # Truy cập thông tin ghế
+                    showtime_seats = s.showtime_seat
+                    total = len(showtime_seats)
+
+                    if total == 0:
+                        logging.warning(f"Showtime ID {s.id} không có ghế nào (total=0), bỏ qua.")
+                        continue
+
+                    # Tính tỷ lệ đặt ghế
+                    booked = sum(1 for ss in showtime_seats if ss.ticket is not None)
+                    fill_rate = booked / total
+
+                    # Tạo fact
+                    facts.append(FactShowtimeFillRate(
+                        date_id=s.start_time.date(),
+                        film_id=s.film_id,
+                        cinema_id=s.room.cinema_id if s.room else None,
+                        showtime_id=s.id,
+                        total_seats=total,
+                        booked_seats=booked,
+                        fill_rate=fill_rate
+                    ))
+
+                    max_time = max(max_time, as_watermark(s.start_time))
+
+                except ZeroDivisionError:
+                    logging.error(f"Lỗi chia cho 0 khi xử lý showtime ID {s.id}")
+                except Exception as item_error:
+                    logging.error(f"Lỗi khi xử lý showtime ID {s.id}: {item_error}")
+
+        with sizer.timed("write"):
+            replaced = replace_facts(session_dest, FactShowtimeFillRate.__table__, "showtime_id", facts)
+            mark_dirty_months(session_dest, "fact_showtime_fillrate", [row.date_id for row in replaced + facts])
+        count += len(facts)
+
     session_dest.commit()
     update_last_loaded_time(session_dest, "fact_showtime_fillrate", max_time)
+    sizer.save(session_dest)
     logging.info(f"Hoàn thành: etl_fact_showtime_fillrate_incremental - Đã xử lý {count} bản ghi mới.")
 
+def promotion_analysis_fact(b, used, BillSrc, FactPromotionAnalysis):
+    """Promotion fact for bill `b`, or None when the bill is not counted."""
+    if b.payment_time is None:
+        logging.warning(f"Bỏ qua Bill ID {b.id}: payment_time is None.")
+        return None
+    if b.status in BillSrc.CLOSED_STATUSES:
+        return None
+
+    return FactPromotionAnalysis(
+        bill_id=b.id,
+        date_id=b.payment_time.date(),
+        promotion_used=used,
+        point=0  # Giả sử point không được sử dụng hoặc luôn là 0
+    )
+
 def etl_fact_promotion_analysis_incremental(session_src, session_dest, BillSrc, BillPromSrc, FactPromotionAnalysis):
     """
     Incremental ETL for the promotion analysis fact table.
@@ -958,7 +1104,8 @@ def etl_fact_promotion_analysis_incremental(session_src, session_dest, BillSrc,
     """
     last_time = get_last_loaded_time(session_dest, "fact_promotion_analysis")
     logging.info(f"Bắt đầu: etl_fact_promotion_analysis_incremental (từ {last_time})")
-    
+    sizer = AdaptiveBatchSizer.from_metadata(session_dest, "fact_promotion_analysis")
+
     # Truy vấn trước bill_id với khuyến mãi đã được áp dụng sau lần ETL cuối
     try:
         logging.info("Truy vấn bill_id sử dụng khuyến mãi từ lần ETL trước...")
@@ -969,49 +1116,158 @@ def etl_fact_promotion_analysis_incremental(session_src, session_dest, BillSrc,
             .filter(BillSrc.payment_time > last_time)
             .distinct()
         )
-        
+
         promo_bill_ids = {row.bill_id for row in promo_bills_query.all()}
         logging.info(f"Đã tìm thấy {len(promo_bill_ids)} bill_id mới đã dùng khuyến mãi.")
     except Exception as e:
         logging.error(f"Lỗi khi truy vấn bill_id từ BillPromSrc: {e}", exc_info=True)
         raise
-    
+
     # Truy vấn các bill mới
     bills_query = (
         session_src.query(BillSrc)
         .filter(BillSrc.payment_time > last_time)
-        .yield_per(BATCH_SIZE)
     )
-    
+
     max_time = last_time
     count = 0
-    
-    for b in bills_query:
-        try:
-            if b.payment_time is None:
-                logging.warning(f"Bỏ qua Bill ID {b.id}: payment_time is None.")
-                continue
-            
-            # Kiểm tra xem bill có dùng khuyến mãi không
-            used = b.id in promo_bill_ids
-            
-            # Tạo fact
-            fact = FactPromotionAnalysis(
-                bill_id=b.id,
-                date_id=b.payment_time.date(),
-                promotion_used=used,
-                point=0  # Giả sử point không được sử dụng hoặc luôn là 0
-            )
-            session_dest.merge(fact)
-            count += 1
-            
-            if b.payment_time > max_time:
-                max_time = b.payment_time
-                
-        except Exception as item_error:
-            logging.error(f"Lỗi khi xử lý bill ID {b.id}: {item_error}")
-    
+
+    for batch in sizer.batches(bills_query, [BillSrc.payment_time, BillSrc.id]):
+        facts = []
+        with sizer.timed("transform"):
+            for b in batch:
+                try:
+                    # Kiểm tra xem bill có dùng khuyến mãi không
+                    fact = promotion_analysis_fact(b, b.id in promo_bill_ids, BillSrc, FactPromotionAnalysis)
+                    if fact is None:
+                        continue
+                    facts.append(fact)
+
+                    max_time = max(max_time, as_watermark(b.payment_time))
+
+                except Exception as item_error:
+                    logging.error(f"Lỗi khi xử lý bill ID {b.id}: {item_error}")
+
+        with sizer.timed("write"):
+            replaced = replace_facts(session_dest, FactPromotionAnalysis.__table__, "bill_id", facts)
+            mark_dirty_months(session_dest, "fact_promotion_analysis", [row.date_id for row in replaced + facts])
+            apply_rollup_delta(session_dest, "fact_promotion_analysis", replaced, facts)
+        count += len(facts)
+
     session_dest.commit()
     update_last_loaded_time(session_dest, "fact_promotion_analysis", max_time)
+    sizer.save(session_dest)
     logging.info(f"Hoàn thành: etl_fact_promotion_analysis_incremental - Đã xử lý {count} bản ghi mới.")
 
+# --- Áp dụng xóa / sửa từ nguồn (etl_change_log) ---
+CHANGE_CHUNK_SIZE = 5000
+# Watermark là id (serial) của log. Id được cấp lúc INSERT chứ không phải lúc commit, nên một id
+# nhỏ hơn có thể hiện ra sau: dừng ở lỗ hổng đầu tiên, trừ khi dòng sau lỗ đã cũ hơn mức này
+# (id của transaction đã rollback thì không bao giờ xuất hiện).
+CHANGE_LOG_GAP_GRACE = timedelta(minutes=5)
+
+def _chunks(ids, size=CHANGE_CHUNK_SIZE):
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+def etl_apply_change_log_incremental(session_src, session_dest, ChangeLogSrc, BillSrc, TicketSrc, ShowtimeSeatSrc,
+                                     ShowtimeSrc, RoomSrc, BillPromSrc, FactRevenue, FactTicketAnalysis, FactPromotionAnalysis):
+    """
+    Propagates deletions and updates captured in the source etl_change_log.
+    The facts of every changed bill/ticket are deleted and rebuilt from the
+    current source rows with the incremental loaders' transforms, so a bill
+    that became valid again is inserted and every column follows the source;
+    a correction still costs O(changed rows).
+    """
+    last_id = get_last_loaded_id(session_dest, "etl_change_log")
+    logging.info(f"Bắt đầu: etl_apply_change_log_incremental (từ id {last_id})")
+
+    now = session_src.execute(select(func.now())).scalar()
+    rows = (
+        session_src.query(ChangeLogSrc.id, ChangeLogSrc.table_name, ChangeLogSrc.record_id, ChangeLogSrc.operation, ChangeLogSrc.changed_at)
+        .filter(ChangeLogSrc.id > last_id)
+        .order_by(ChangeLogSrc.id)
+        .all()
+    )
+    changes, expected_id = [], last_id + 1
+    for row in rows:
+        if row.id != expected_id and now - row.changed_at < CHANGE_LOG_GAP_GRACE:
+            logging.info(f"etl_change_log thiếu id {expected_id}..{row.id - 1} (transaction chưa commit?), dừng tại đây.")
+            break
+        changes.append(row)
+        expected_id = row.id + 1
+    if not changes:
+        logging.info("Không có thay đổi mới trong etl_change_log.")
+        return
+
+    deleted = {"bills": set(), "tickets": set()}
+    updated = {"bills": set(), "tickets": set()}
+    for change in changes:
+        if change.table_name in deleted:
+            (deleted if change.operation == "DELETE" else updated)[change.table_name].add(change.record_id)
+    max_id = changes[-1].id
+
+    revenue = FactRevenue.__table__
+    tickets = FactTicketAnalysis.__table__
+    promotions = FactPromotionAnalysis.__table__
+    try:
+        # 1. Bill cần dựng lại: bill được sửa/xóa, cùng bill cũ (theo fact) và bill hiện tại (theo nguồn)
+        #    của ticket được sửa/xóa, vì film/cinema của doanh thu lấy từ ticket đầu tiên của bill
+        changed_tickets = updated["tickets"] | deleted["tickets"]
+        bill_ids = updated["bills"] | deleted["bills"]
+        bill_ids.update(row.bill_id for row in fetch_fact_rows(session_dest, tickets, [(tickets.c.ticket_id, changed_tickets)]))
+        for chunk in _chunks(changed_tickets):
+            bill_ids.update(bill_id for (bill_id,) in session_src.query(TicketSrc.bill_id).filter(TicketSrc.id.in_(chunk)))
+
+        # 2. Dựng lại fact từ trạng thái nguồn hiện tại bằng cùng phép biến đổi với loader incremental;
+        #    bill/ticket đã mất, bị hủy hoặc chưa thanh toán không cho ra fact nào, tức là bị xóa
+        rebuilt = {"fact_revenue": [], "fact_promotion_analysis": []}
+        for chunk in _chunks(bill_ids):
+            promo_bill_ids = {row.bill_id for row in session_src.query(BillPromSrc.bill_id).filter(BillPromSrc.bill_id.in_(chunk))}
+            for bill in session_src.query(BillSrc).filter(BillSrc.id.in_(chunk)).options(selectinload(BillSrc.user_bill)):
+                rebuilt["fact_revenue"].append(
+                    revenue_fact(session_src, bill, BillSrc, TicketSrc, ShowtimeSeatSrc, ShowtimeSrc, RoomSrc, FactRevenue))
+                rebuilt["fact_promotion_analysis"].append(
+                    promotion_analysis_fact(bill, bill.id in promo_bill_ids, BillSrc, FactPromotionAnalysis))
+        ticket_facts = {}  # theo ticket_id: một ticket có thể khớp cả theo bill lẫn theo id
+        ticket_query = session_src.query(TicketSrc).join(BillSrc).options(contains_eager(TicketSrc.bill))
+        for column, keys in ((TicketSrc.bill_id, bill_ids), (TicketSrc.id, changed_tickets)):
+            for chunk in _chunks(keys):
+                for t in ticket_query.filter(column.in_(chunk)):
+                    ticket_facts[t.id] = ticket_analysis_fact(t, BillSrc, FactTicketAnalysis)
+        rebuilt["fact_ticket_analysis"] = list(ticket_facts.values())
+        rebuilt = {name: [fact for fact in facts if fact is not None] for name, facts in rebuilt.items()}
+
+        # 3. Chụp các dòng fact sắp bị thay (mọi date_id) để tính delta rollup
+        #    và đánh dấu cả tháng cũ lẫn tháng mới cho mart
+        ticket_ids = changed_tickets | {fact.ticket_id for fact in rebuilt["fact_ticket_analysis"]}
+        lookups = {
+            "fact_revenue": (revenue, [(revenue.c.bill_id, bill_ids)]),
+            "fact_promotion_analysis": (promotions, [(promotions.c.bill_id, bill_ids)]),
+            "fact_ticket_analysis": (tickets, [(tickets.c.bill_id, bill_ids), (tickets.c.ticket_id, ticket_ids)]),
+        }
+
+        # 4. Ghi theo lô: DELETE ... WHERE IN rồi INSERT executemany; rollup và dấu tháng cùng transaction
+        removed = 0
+        for name, (table, lookup) in lookups.items():
+            before = fetch_fact_rows(session_dest, table, lookup)
+            for column, keys in lookup:
+                for chunk in _chunks(keys):
+                    session_dest.execute(table.delete().where(column.in_(chunk)))
+            write_facts(session_dest, table, rebuilt[name])
+            apply_rollup_delta(session_dest, name, before, rebuilt[name])
+            mark_dirty_months(session_dest, name, [row.date_id for row in before + rebuilt[name]])
+            removed += len(before)
+
+        session_dest.commit()
+    except SQLAlchemyError as db_error:
+        logging.error(f"Lỗi SQLAlchemy trong etl_apply_change_log_incremental: {db_error}", exc_info=True)
+        session_dest.rollback()
+        raise
+
+    update_last_loaded_id(session_dest, "etl_change_log", max_id)
+    logging.info(
+        f"Hoàn thành: etl_apply_change_log_incremental - {len(changes)} thay đổi, "
+        f"thay {removed} dòng fact bằng {sum(len(facts) for facts in rebuilt.values())} dòng dựng lại từ {len(bill_ids)} bill / {len(ticket_ids)} ticket."
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime
+from sqlalchemy import Column, String, DateTime, Integer, BigInteger
 from configs.database import Base
 
 
@@ -7,3 +7,5 @@ class ETLMetadata(Base):
 
     table_name = Column(String, primary_key=True)
     last_loaded_time = Column(DateTime)
+    batch_size = Column(Integer)
+    last_loaded_id = Column(BigInteger)  # watermark theo id cho nguồn dạng log (etl_change_log)
@@ -1,11 +1,15 @@
 from datetime import datetime
+from sqlalchemy import select, func, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from warehouse.etl_metadata.models.etl_metadata import ETLMetadata
+from warehouse.warehouse_models import EtlDirtyMonth
 
 
 def get_last_loaded_time(session: Session, table_name: str):
     meta = session.query(ETLMetadata).filter_by(table_name=table_name).first()
-    return meta.last_loaded_time if meta else datetime(2000, 1, 1)  # mặc định nếu chưa có
+    # mặc định nếu chưa có (dòng có thể chỉ mang batch_size)
+    return meta.last_loaded_time if meta and meta.last_loaded_time else datetime(2000, 1, 1)
 
 def update_last_loaded_time(session: Session, table_name: str, new_time: datetime):
     meta = session.query(ETLMetadata).filter_by(table_name=table_name).first()
@@ -16,3 +20,75 @@ def update_last_loaded_time(session: Session, table_name: str, new_time: datetim
     session.merge(meta)
     session.commit()
 
+def get_last_loaded_id(session: Session, table_name: str):
+    meta = session.query(ETLMetadata).filter_by(table_name=table_name).first()
+    return meta.last_loaded_id if meta and meta.last_loaded_id is not None else 0
+
+def update_last_loaded_id(session: Session, table_name: str, new_id: int):
+    meta = session.query(ETLMetadata).filter_by(table_name=table_name).first()
+    if not meta:
+        meta = ETLMetadata(table_name=table_name, last_loaded_id=new_id)
+    else:
+        meta.last_loaded_id = new_id
+    session.merge(meta)
+    session.commit()
+
+def get_batch_size(session: Session, table_name: str):
+    meta = session.query(ETLMetadata).filter_by(table_name=table_name).first()
+    return meta.batch_size if meta else None  # None nếu loader chưa từng được tinh chỉnh
+
+def update_batch_size(session: Session, table_name: str, batch_size: int):
+    meta = session.query(ETLMetadata).filter_by(table_name=table_name).first()
+    if not meta:
+        meta = ETLMetadata(table_name=table_name, batch_size=batch_size)
+    else:
+        meta.batch_size = batch_size
+    session.merge(meta)
+    session.commit()
+
+# --- Theo dõi các tháng có dữ liệu fact thay đổi (dùng cho refresh mart incremental) ---
+# Loader giữ shared advisory lock khi ghi dấu, bên đọc giữ exclusive lock khi lấy mốc thời gian:
+# nhờ vậy không dấu nào của một transaction chưa commit bị bỏ sót giữa hai lần refresh.
+DIRTY_MONTH_LOCK_KEY = 720_031
+
+def mark_dirty_months(session: Session, table_name: str, dates):
+    months = {(d.year, d.month) for d in dates if d is not None}
+    if not months:
+        return
+    session.execute(select(func.pg_advisory_xact_lock_shared(DIRTY_MONTH_LOCK_KEY)))
+    stmt = insert(EtlDirtyMonth).values([
+        {"table_name": table_name, "year": year, "month": month} for year, month in sorted(months)
+    ])
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=["table_name", "year", "month"],
+        set_={"marked_at": func.clock_timestamp()},
+    ))
+
+def mark_all_months_dirty(session: Session, table_name: str):
+    """Mark every month present in `table_name`; used by the full (non-incremental) loaders."""
+    session.execute(select(func.pg_advisory_xact_lock_shared(DIRTY_MONTH_LOCK_KEY)))
+    session.execute(text(
+        "INSERT INTO etl_dirty_month (table_name, year, month, marked_at)"
+        f" SELECT DISTINCT :table_name, extract(year FROM date_id)::int, extract(month FROM date_id)::int, clock_timestamp() FROM {table_name}"
+        " ON CONFLICT (table_name, year, month) DO UPDATE SET marked_at = EXCLUDED.marked_at"
+    ), {"table_name": table_name})
+
+def get_dirty_months(session: Session, table_names, since):
+    """
+    Return ({(year, month), ...}, watermark) for months of `table_names` written
+    after `since`; months is None when `since` is None (never refreshed: rebuild all).
+    The caller stores the watermark as its next `since`.
+    """
+    session.execute(select(func.pg_advisory_xact_lock(DIRTY_MONTH_LOCK_KEY)))
+    watermark = session.execute(select(func.clock_timestamp())).scalar()
+    months = None
+    if since is not None:
+        rows = (
+            session.query(EtlDirtyMonth.year, EtlDirtyMonth.month)
+            .filter(EtlDirtyMonth.table_name.in_(list(table_names)), EtlDirtyMonth.marked_at > since)
+            .distinct()
+            .all()
+        )
+        months = {(year, month) for year, month in rows}
+    session.commit()  # nhả advisory lock
+    return months, watermark
@@ -0,0 +1,44 @@
+import logging
+from sqlalchemy.orm import sessionmaker
+from warehouse.etl import (
+    etl_fact_ticket_analysis_incremental,
+    etl_fact_film_rating_incremental,
+    etl_fact_revenue_incremental,
+    etl_fact_showtime_fillrate_incremental,
+    etl_fact_promotion_analysis_incremental,
+    etl_apply_change_log_incremental,
+)
+from warehouse.partitions import maintain_partitions
+from warehouse.warehouse_models import (
+    FactTicketAnalysis, FactFilmRating, FactRevenue, FactShowtimeFillRate, FactPromotionAnalysis,
+)
+from ticket.models.ticket import Ticket
+from bill.models.bill import Bill
+from rate.models.rate import Rate
+from room.models.room import Room
+from showtime.models.showtime import Showtime
+from showtime_seat.models.showtime_seat import ShowtimeSeat
+from bill_prom.models.bill_prom import BillProm
+from etl_change_log.models.etl_change_log import ETLChangeLog
+
+
+def run_incremental_etl(src_engine, dest_engine):
+    """Run every incremental fact loader, then apply source deletions/updates. Shared by the scheduler, the API and the mart runner."""
+    # Tạo trước partition theo tháng khi chưa session nào giữ lock trên bảng fact
+    maintain_partitions(dest_engine)
+
+    src_session = sessionmaker(bind=src_engine)()
+    dest_session = sessionmaker(bind=dest_engine)()
+    try:
+        etl_fact_ticket_analysis_incremental(src_session, dest_session, Ticket, Bill, FactTicketAnalysis)
+        etl_fact_film_rating_incremental(src_session, dest_session, Rate, FactFilmRating)
+        etl_fact_revenue_incremental(src_session, dest_session, Bill, Ticket, ShowtimeSeat, Showtime, Room, FactRevenue)
+        etl_fact_showtime_fillrate_incremental(src_session, dest_session, Showtime, ShowtimeSeat, FactShowtimeFillRate)
+        etl_fact_promotion_analysis_incremental(src_session, dest_session, Bill, BillProm, FactPromotionAnalysis)
+        # Sau khi nạp dữ liệu mới: gỡ / sửa các fact có bill, ticket đã bị xóa hoặc chỉnh ở nguồn
+        etl_apply_change_log_incremental(src_session, dest_session, ETLChangeLog, Bill, Ticket, ShowtimeSeat, Showtime, Room,
+                                         BillProm, FactRevenue, FactTicketAnalysis, FactPromotionAnalysis)
+        logging.info("ETL incremental warehouse hoàn tất.")
+    finally:
+        src_session.close()
+        dest_session.close()
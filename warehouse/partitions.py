@@ -0,0 +1,97 @@
+import logging
+from datetime import date
+from sqlalchemy import text
+
+
+PARTITIONED_FACT_TABLES = (
+    "fact_revenue",
+    "fact_ticket_analysis",
+    "fact_film_rating",
+    "fact_showtime_fillrate",
+    "fact_promotion_analysis",
+)
+FUTURE_MONTHS = 3  # Luôn có sẵn partition cho tháng hiện tại và 3 tháng tới (suất chiếu đặt trước)
+
+
+def month_start(d: date):
+    return date(d.year, d.month, 1)
+
+def add_months(d: date, months: int):
+    year, month = divmod(d.month - 1 + months, 12)
+    return date(d.year + year, month + 1, 1)
+
+def partition_name(table_name: str, month: date):
+    return f"{table_name}_y{month.year}m{month.month:02d}"
+
+def default_partition_name(table_name: str):
+    return f"{table_name}_default"
+
+
+def _existing_partitions(conn, table_name):
+    rows = conn.execute(
+        text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid"
+             " WHERE i.inhparent = CAST(:table_name AS regclass)"),
+        {"table_name": table_name},
+    )
+    return {row[0] for row in rows}
+
+
+def _create_month_partition(conn, table_name, month, has_default):
+    """
+    Create the partition for one month. Rows of that month that already landed
+    in the DEFAULT partition are moved into it before ATTACH, so attaching never
+    fails on overlapping data.
+    """
+    name = partition_name(table_name, month)
+    lower, upper = month, add_months(month, 1)
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {table_name} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    if has_default:
+        conn.execute(
+            text(f"WITH moved AS (DELETE FROM {default_partition_name(table_name)}"
+                 f" WHERE date_id >= :lower AND date_id < :upper RETURNING *)"
+                 f" INSERT INTO {name} SELECT * FROM moved"),
+            {"lower": lower, "upper": upper},
+        )
+    conn.execute(text(f"ALTER TABLE {table_name} ATTACH PARTITION {name} FOR VALUES FROM ('{lower}') TO ('{upper}')"))
+
+
+def ensure_month_partitions(engine, table_name, months):
+    """Create any missing monthly partitions; each one in its own short transaction."""
+    with engine.begin() as conn:
+        existing = _existing_partitions(conn, table_name)
+    has_default = default_partition_name(table_name) in existing
+
+    created = []
+    for month in sorted({month_start(m) for m in months if m is not None}):
+        if partition_name(table_name, month) in existing:
+            continue
+        with engine.begin() as conn:
+            _create_month_partition(conn, table_name, month, has_default)
+        created.append(partition_name(table_name, month))
+
+    if created:
+        logging.info(f"Đã tạo partition cho {table_name}: {', '.join(created)}")
+    return created
+
+
+def maintain_partitions(engine, future_months=FUTURE_MONTHS, today=None):
+    """
+    Keep every fact table ready for loading: a DEFAULT partition as safety net,
+    partitions for the current and next `future_months` months, and a dedicated
+    partition for any month whose rows ended up in DEFAULT.
+
+    Must run before the loaders open their transaction on the fact tables,
+    because CREATE/ATTACH PARTITION locks the parent table.
+    """
+    this_month = month_start(today or date.today())
+    upcoming = [add_months(this_month, i) for i in range(future_months + 1)]
+
+    for table_name in PARTITIONED_FACT_TABLES:
+        default_name = default_partition_name(table_name)
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE TABLE IF NOT EXISTS {default_name} PARTITION OF {table_name} DEFAULT"))
+            stray_months = list(conn.execute(
+                text(f"SELECT DISTINCT date_trunc('month', date_id)::date FROM {default_name}")
+            ).scalars())
+        ensure_month_partitions(engine, table_name, upcoming + stray_months)
+
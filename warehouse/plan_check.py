@@ -0,0 +1,102 @@
+import argparse
+import json
+import logging
+import re
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from mart.queries import showtime_fill_rate_query, fill_rate_heatmap_query, customer_sketch_query, cohort_activity_query
+from warehouse.partitions import PARTITIONED_FACT_TABLES, add_months, partition_name
+from warehouse.synthetic import build_synthetic_warehouse, START_DATE, MONTHS
+
+
+# Các job mart còn đọc bảng fact (mart/analysis.py), lấy đúng builder mà job dùng: mỗi builder nhận
+# tập (year, month) cần refresh và được kiểm tra với một tháng. Các job còn lại đọc rollup agg_daily_*
+# (không partition, nhỏ) nên không cần kiểm tra prune.
+MART_QUERIES = {
+    "showtime_fill_rate": showtime_fill_rate_query,
+    "fill_rate_heatmap": fill_rate_heatmap_query,
+    "customer_sketch": customer_sketch_query,
+    "cohort_retention": cohort_activity_query,
+}
+
+PARTITION_PATTERN = re.compile(r"^(?P<table>fact_\w+?)_(?:y(?P<year>\d{4})m(?P<month>\d{2})|default)$")
+
+
+def _scan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _scan_nodes(child)
+
+
+def compile_query(build, month):
+    """SQL text of the mart query `build` refreshing `month`, compiled with the PostgreSQL dialect."""
+    statement = build({(month.year, month.month)})
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def check_query_plan(conn, name, build, month):
+    """
+    EXPLAIN one mart query for `month` and return the list of violations:
+    a sequential scan on an unpartitioned fact table, or any scan on a fact
+    partition outside the requested month (failed pruning).
+    """
+    plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compile_query(build, month)}").scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    violations = []
+    for node in _scan_nodes(plan[0]["Plan"]):
+        relation = node.get("Relation Name")
+        if not relation or not relation.startswith("fact_"):
+            continue
+        node_type = node["Node Type"]
+        match = PARTITION_PATTERN.match(relation)
+
+        if match is None:
+            if relation in PARTITIONED_FACT_TABLES or node_type == "Seq Scan":
+                violations.append(f"{node_type} trên bảng fact không partition {relation}")
+            continue
+
+        if relation != partition_name(match.group("table"), month):
+            violations.append(f"{node_type} trên {relation} nằm ngoài tháng {month:%Y-%m} (không prune được partition)")
+
+    return violations, plan
+
+
+def run_plan_checks(engine, month):
+    results = {}
+    with engine.connect() as conn:
+        for name, build in MART_QUERIES.items():
+            violations, plan = check_query_plan(conn, name, build, month)
+            results[name] = {"violations": violations, "plan": plan}
+            status = "OK" if not violations else "FAIL"
+            logging.info(f"[{status}] {name}" + "".join(f"\n    - {v}" for v in violations))
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Kiểm tra plan EXPLAIN của các truy vấn mart trên warehouse giả lập")
+    parser.add_argument("--url", required=True, help="Database scratch; sẽ bị xóa và tạo lại trừ khi dùng --skip-build")
+    parser.add_argument("--scale", type=float, default=1)
+    parser.add_argument("--skip-build", action="store_true", help="Dùng lại dữ liệu đã sinh ở lần chạy trước")
+    parser.add_argument("--month", help="Tháng cần kiểm tra, dạng YYYY-MM (mặc định: tháng giữa khoảng dữ liệu)")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    if not args.skip_build:
+        build_synthetic_warehouse(engine, scale=args.scale)
+
+    if args.month:
+        year, month = map(int, args.month.split("-"))
+        target_month = date(year, month, 1)
+    else:
+        target_month = add_months(START_DATE, MONTHS // 2)
+
+    results = run_plan_checks(engine, target_month)
+    failed = [name for name, result in results.items() if result["violations"]]
+    if failed:
+        logging.error(f"Plan không đạt: {', '.join(failed)}")
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,127 @@
+import logging
+from datetime import date
+from sqlalchemy import text
+from warehouse.warehouse_models import Base
+from warehouse.partitions import PARTITIONED_FACT_TABLES, ensure_month_partitions, maintain_partitions, add_months
+from warehouse.rollup import ROLLUP_SPECS, rebuild_rollup
+from warehouse.matviews import MATERIALIZED_VIEWS, create_materialized_views
+
+
+BASE_BILLS = 100_000   # Số bill ở scale 1x; các fact khác tỉ lệ theo số này
+MONTHS = 24
+START_DATE = date(2023, 1, 1)
+CINEMAS = 20
+FILMS = 300
+GENRES = 12
+
+
+def _fill_dimensions(conn, start, end, showtimes):
+    conn.execute(text(
+        "INSERT INTO dim_date (date_id, day, month, year, quarter, week, weekday, is_weekend)"
+        " SELECT d::date, extract(day FROM d), extract(month FROM d), extract(year FROM d),"
+        " extract(quarter FROM d), extract(week FROM d), trim(to_char(d, 'Day')), extract(isodow FROM d) >= 6"
+        " FROM generate_series(CAST(:start AS date), CAST(:end AS date) - 1, interval '1 day') d"
+    ), {"start": start, "end": end})
+    conn.execute(text(
+        "INSERT INTO dim_time (time_id, hour, minute, period)"
+        " SELECT m, m / 60, m % 60, CASE WHEN m < 720 THEN 'AM' ELSE 'PM' END FROM generate_series(0, 1439) m"
+    ))
+    conn.execute(text(
+        "INSERT INTO dim_payment_method (payment_method_id, method_name) VALUES"
+        " (1, 'Thanh toán tiền mặt'), (2, 'Thanh toán bằng thẻ tín dụng'), (3, 'Thanh toán bằng ví điện tử')"
+    ))
+    conn.execute(text(
+        "INSERT INTO dim_purchase_type (purchase_type_id, type_name) VALUES (1, 'Tại quầy'), (2, 'Online')"
+    ))
+    conn.execute(text(
+        "INSERT INTO dim_cinema (cinema_id, name, address, phone_number)"
+        " SELECT g, 'Rạp ' || g, 'Địa chỉ ' || g, '0900' || lpad(g::text, 6, '0') FROM generate_series(1, :n) g"
+    ), {"n": CINEMAS})
+    conn.execute(text(
+        "INSERT INTO dim_film (film_id, title, duration, status)"
+        " SELECT g, 'Phim ' || g, 90 + g % 60, 'ACTIVE' FROM generate_series(1, :n) g"
+    ), {"n": FILMS})
+    conn.execute(text(
+        "INSERT INTO dim_genre (genre_id, name) SELECT g, 'Thể loại ' || g FROM generate_series(1, :n) g"
+    ), {"n": GENRES})
+    conn.execute(text(
+        "INSERT INTO fact_film_genre (film_id, genre_id, point)"
+        " SELECT f, 1 + f % :genres, 0 FROM generate_series(1, :films) f"
+        " UNION ALL SELECT f, 1 + (f * 7 + 3) % :genres, 0 FROM generate_series(1, :films, 3) f WHERE (f * 7 + 3) % :genres <> f % :genres"
+    ), {"films": FILMS, "genres": GENRES})
+    conn.execute(text(
+        "INSERT INTO dim_showtime (showtime_id, name, start_time, film_id, room_id)"
+        " SELECT g, 'Suất ' || g, CAST(:start AS timestamp) + random() * (CAST(:end AS timestamp) - CAST(:start AS timestamp)),"
+        " 1 + (g % :films), 1 + (g % 100) FROM generate_series(1, :n) g"
+    ), {"start": start, "end": end, "films": FILMS, "n": showtimes})
+
+
+def _fill_facts(conn, start, days, bills, showtimes):
+    # Phim phân bố lệch (power(random(), 2)) để top phim có ý nghĩa
+    film_expr = f"LEAST({FILMS}, 1 + floor({FILMS} * power(random(), 2))::int)"
+    date_expr = "CAST(:start AS date) + floor(random() * :days)::int"
+
+    conn.execute(text(
+        "INSERT INTO fact_revenue (bill_id, date_id, time_id, film_id, cinema_id, user_id, value, payment_method_id, purchase_type_id)"
+        f" SELECT g, {date_expr}, floor(random() * 1440)::int, {film_expr}, 1 + floor(random() * :cinemas)::int,"
+        " 1 + floor(random() * :users)::int,"
+        " 45000 + floor(random() * 255000)::int, 1 + floor(random() * 3)::int, 1 + floor(random() * 2)::int"
+        " FROM generate_series(1, :n) g"
+    ), {"start": start, "days": days, "cinemas": CINEMAS, "users": max(1, bills // 3), "n": bills})
+    conn.execute(text(
+        "INSERT INTO fact_ticket_analysis (ticket_id, bill_id, date_id, time_id, price, payment_method_id, purchase_type_id)"
+        " SELECT g, r.bill_id, r.date_id, r.time_id, 45000 + floor(random() * 100000)::int, r.payment_method_id, r.purchase_type_id"
+        " FROM generate_series(1, :n) g JOIN fact_revenue r ON r.bill_id = 1 + (g - 1) / 2"
+    ), {"n": bills * 2})
+    conn.execute(text(
+        "INSERT INTO fact_film_rating (user_id, film_id, date_id, point, detail)"
+        f" SELECT 1 + floor(random() * :users)::int, {film_expr}, {date_expr}, 1 + floor(random() * 5)::int, NULL"
+        " FROM generate_series(1, :n) g"
+    ), {"start": start, "days": days, "users": max(1, bills // 3), "n": max(1, bills // 5)})
+    conn.execute(text(
+        "INSERT INTO fact_showtime_fillrate (date_id, film_id, cinema_id, showtime_id, total_seats, booked_seats, fill_rate)"
+        " SELECT s.start_time::date, s.film_id, 1 + (s.room_id - 1) % :cinemas, s.showtime_id, 100, b, b / 100.0"
+        " FROM (SELECT showtime_id, start_time, film_id, room_id, floor(random() * 101)::int AS b FROM dim_showtime) s"
+    ), {"cinemas": CINEMAS})
+    conn.execute(text(
+        "INSERT INTO fact_promotion_analysis (bill_id, date_id, promotion_used, point)"
+        " SELECT bill_id, date_id, random() < 0.3, 0 FROM fact_revenue"
+    ))
+
+
+def build_synthetic_warehouse(engine, scale=1, months=MONTHS, start=START_DATE, seed=0.42):
+    """
+    Drop and regenerate every warehouse table behind `engine` with synthetic
+    data: BASE_BILLS * scale bills spread over `months` months, populated
+    dim_date/dim_time, proportional ticket, rating, fill-rate and promotion
+    facts, and the daily rollups. Destructive - only point it at a scratch
+    database.
+    """
+    end = add_months(start, months)
+    days = (end - start).days
+    bills = int(BASE_BILLS * scale)
+    showtimes = max(1, bills // 20)
+    logging.info(f"Tạo warehouse giả lập scale={scale}: {bills} bill, {months} tháng từ {start}")
+
+    with engine.begin() as conn:
+        # Materialized view phụ thuộc vào bảng rollup, phải xóa trước drop_all
+        for name in MATERIALIZED_VIEWS:
+            conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {name}"))
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    for table_name in PARTITIONED_FACT_TABLES:
+        ensure_month_partitions(engine, table_name, [add_months(start, i) for i in range(months)])
+    maintain_partitions(engine)
+
+    with engine.begin() as conn:
+        conn.execute(text("SELECT setseed(:seed)"), {"seed": seed})
+        _fill_dimensions(conn, start, end, showtimes)
+        _fill_facts(conn, start, days, bills, showtimes)
+        for fact_table in ROLLUP_SPECS:
+            rebuild_rollup(conn, fact_table)
+        create_materialized_views(conn)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM ANALYZE"))
+
+    return {"scale": scale, "bills": bills, "months": months, "start": start, "end": end}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Date, ForeignKey, Float, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Date, ForeignKey, Float, DateTime, Index
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
 
@@ -13,6 +13,9 @@ class DimPaymentMethod(Base):
 
 class DimDate(Base):
     __tablename__ = "dim_date"
+    __table_args__ = (
+        Index("ix_dim_date_year_month", "year", "month", "date_id"),
+    )
 
     date_id = Column(Date, primary_key=True)
     day = Column(Integer, nullable=False)
@@ -109,15 +112,30 @@ class DimPurchaseType(Base):
 
 
 # ===== FACTS =====
+# Các bảng fact được partition theo tháng trên date_id (xem warehouse/partitions.py),
+# nên date_id bắt buộc và nằm trong khóa chính.
+FACT_PARTITION_ARGS = {"postgresql_partition_by": "RANGE (date_id)"}
 
 class FactRevenue(Base):
     __tablename__ = "fact_revenue"
+    __table_args__ = (
+        Index("ix_fact_revenue_date_id_brin", "date_id", postgresql_using="brin"),
+        Index("ix_fact_revenue_film_id", "film_id"),
+        Index("ix_fact_revenue_cinema_id", "cinema_id"),
+        Index("ix_fact_revenue_payment_method_id", "payment_method_id"),
+        # Covering index cho các mart gom nhóm theo tháng
+        Index("ix_fact_revenue_date_payment_cov", "date_id", "payment_method_id", postgresql_include=["value"]),
+        Index("ix_fact_revenue_date_cinema_cov", "date_id", "cinema_id", postgresql_include=["value"]),
+        Index("ix_fact_revenue_date_film_cov", "date_id", "film_id", postgresql_include=["value"]),
+        FACT_PARTITION_ARGS,
+    )
 
     bill_id = Column(Integer, primary_key=True)
-    date_id = Column(Date, ForeignKey("dim_date.date_id"))
+    date_id = Column(Date, ForeignKey("dim_date.date_id"), primary_key=True)
     time_id = Column(Integer, ForeignKey("dim_time.time_id"))
     film_id = Column(Integer, ForeignKey("dim_film.film_id"))
     cinema_id = Column(Integer, ForeignKey("dim_cinema.cinema_id"))
+    user_id = Column(Integer)  # khách hàng từ user_bills; NULL nếu bill không gắn tài khoản
     value = Column(Integer, nullable=False)
     etl_loaded_at = Column(DateTime, server_default=func.now())
 
@@ -128,10 +146,16 @@ class FactRevenue(Base):
 
 class FactTicketAnalysis(Base):
     __tablename__ = "fact_ticket_analysis"
+    __table_args__ = (
+        Index("ix_fact_ticket_analysis_date_id_brin", "date_id", postgresql_using="brin"),
+        Index("ix_fact_ticket_analysis_bill_id", "bill_id"),
+        Index("ix_fact_ticket_analysis_payment_method_id", "payment_method_id"),
+        FACT_PARTITION_ARGS,
+    )
 
     ticket_id = Column(Integer, primary_key=True)
     bill_id = Column(Integer)
-    date_id = Column(Date, ForeignKey("dim_date.date_id"))
+    date_id = Column(Date, ForeignKey("dim_date.date_id"), primary_key=True)
     time_id = Column(Integer, ForeignKey("dim_time.time_id"))
     price = Column(Integer, nullable=False)
     etl_loaded_at = Column(DateTime, server_default=func.now())
@@ -143,11 +167,16 @@ class FactTicketAnalysis(Base):
 
 class FactFilmRating(Base):
     __tablename__ = "fact_film_rating"
+    __table_args__ = (
+        Index("ix_fact_film_rating_date_id_brin", "date_id", postgresql_using="brin"),
+        Index("ix_fact_film_rating_film_cov", "film_id", postgresql_include=["point"]),
+        FACT_PARTITION_ARGS,
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer)
     film_id = Column(Integer, ForeignKey("dim_film.film_id"))
-    date_id = Column(Date, ForeignKey("dim_date.date_id"))
+    date_id = Column(Date, ForeignKey("dim_date.date_id"), primary_key=True)
     point = Column(Integer, nullable=False)
     detail = Column(String)
     etl_loaded_at = Column(DateTime, server_default=func.now())
@@ -155,10 +184,17 @@ class FactFilmRating(Base):
 
 class FactShowtimeFillRate(Base):
     __tablename__ = "fact_showtime_fillrate"
+    __table_args__ = (
+        Index("ix_fact_showtime_fillrate_date_id_brin", "date_id", postgresql_using="brin"),
+        Index("ix_fact_showtime_fillrate_showtime_id", "showtime_id"),
+        Index("ix_fact_showtime_fillrate_date_film_cov", "date_id", "film_id", postgresql_include=["fill_rate"]),
+        FACT_PARTITION_ARGS,
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    date_id = Column(Date, ForeignKey("dim_date.date_id"))
+    date_id = Column(Date, ForeignKey("dim_date.date_id"), primary_key=True)
     film_id = Column(Integer, ForeignKey("dim_film.film_id"))
+    cinema_id = Column(Integer, ForeignKey("dim_cinema.cinema_id"))  # lấy qua phòng chiếu của suất chiếu
     showtime_id = Column(Integer, ForeignKey("dim_showtime.showtime_id"))
     total_seats = Column(Integer, nullable=False)
     booked_seats = Column(Integer, nullable=False)
@@ -168,10 +204,16 @@ class FactShowtimeFillRate(Base):
 
 class FactPromotionAnalysis(Base):
     __tablename__ = "fact_promotion_analysis"
+    __table_args__ = (
+        Index("ix_fact_promotion_analysis_date_id_brin", "date_id", postgresql_using="brin"),
+        Index("ix_fact_promotion_analysis_bill_id", "bill_id"),
+        Index("ix_fact_promotion_analysis_date_cov", "date_id", postgresql_include=["promotion_used"]),
+        FACT_PARTITION_ARGS,
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     bill_id = Column(Integer)
-    date_id = Column(Date, ForeignKey("dim_date.date_id"))
+    date_id = Column(Date, ForeignKey("dim_date.date_id"), primary_key=True)
     promotion_used = Column(Boolean, nullable=False)
     point = Column(Integer, nullable=False)
 
@@ -180,4 +222,77 @@ class FactFilmGenre(Base):
 
     film_id = Column(Integer, ForeignKey("dim_film.film_id"), primary_key=True)
     genre_id = Column(Integer, ForeignKey("dim_genre.genre_id"), primary_key=True)
-    point = Column(Integer, nullable=False)
\ No newline at end of file
+    point = Column(Integer, nullable=False)
+
+
+# ===== ROLLUPS =====
+# Tổng hợp theo ngày, được ETL cập nhật cộng dồn cùng transaction với bảng fact (xem warehouse/rollup.py).
+# Khóa không được NULL nên chiều không xác định được ghi là 0 (UNKNOWN_ID).
+
+class AggDailyRevenue(Base):
+    __tablename__ = "agg_daily_revenue"
+
+    date_id = Column(Date, primary_key=True)
+    cinema_id = Column(Integer, primary_key=True)
+    film_id = Column(Integer, primary_key=True)
+    payment_method_id = Column(Integer, primary_key=True)
+    purchase_type_id = Column(Integer, primary_key=True)
+    bill_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(BigInteger, nullable=False, default=0)
+
+
+class AggDailyTicket(Base):
+    __tablename__ = "agg_daily_ticket"
+
+    date_id = Column(Date, primary_key=True)
+    payment_method_id = Column(Integer, primary_key=True)
+    purchase_type_id = Column(Integer, primary_key=True)
+    ticket_count = Column(Integer, nullable=False, default=0)
+    ticket_revenue = Column(BigInteger, nullable=False, default=0)
+
+
+class AggDailyPromotion(Base):
+    __tablename__ = "agg_daily_promotion"
+
+    date_id = Column(Date, primary_key=True)
+    used_count = Column(Integer, nullable=False, default=0)
+    not_used_count = Column(Integer, nullable=False, default=0)
+
+
+class AggDailyRating(Base):
+    __tablename__ = "agg_daily_rating"
+
+    date_id = Column(Date, primary_key=True)
+    film_id = Column(Integer, primary_key=True)
+    rating_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(BigInteger, nullable=False, default=0)
+    rating_1 = Column(Integer, nullable=False, default=0)  # số đánh giá 1 điểm
+    rating_2 = Column(Integer, nullable=False, default=0)
+    rating_3 = Column(Integer, nullable=False, default=0)
+    rating_4 = Column(Integer, nullable=False, default=0)
+    rating_5 = Column(Integer, nullable=False, default=0)
+
+
+# ===== ETL BOOKKEEPING =====
+
+class EtlDirtyMonth(Base):
+    """(fact table, year, month) partitions that received writes, with the time of the last write."""
+    __tablename__ = "etl_dirty_month"
+
+    table_name = Column(String, primary_key=True)
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    marked_at = Column(DateTime(timezone=True), nullable=False, server_default=func.clock_timestamp())
+
+
+class MvRefreshLog(Base):
+    """One row per materialized view refresh, with its duration."""
+    __tablename__ = "mv_refresh_log"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    view_name = Column(String, nullable=False, index=True)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    duration_ms = Column(Integer, nullable=False)
+    concurrent = Column(Boolean, nullable=False)
+    status = Column(String, nullable=False)  # OK | FAILED
+    error = Column(String)